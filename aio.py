@@ -0,0 +1,109 @@
+import asyncio
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+import cosmic_cipher
+import file_cipher
+from cosmic_cipher import StreamEncryptor, StreamDecryptor, DEFAULT_STREAM_CHUNK_SIZE, MAX_STREAM_CHUNK_SIZE
+from entropy_pool import EntropyPool
+
+# Executor used when a call does not pass one; None means the loop's default
+_executor: Optional[Executor] = None
+
+def set_executor(executor: Optional[Executor]) -> None:
+    """Run CPU-bound cipher work on executor by default (None: the loop's default)."""
+    global _executor
+    _executor = executor
+
+async def _offload(executor: Optional[Executor], fn: Callable, *args, **kwargs) -> Any:
+    """Run fn in executor (or the module default) without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor or _executor, partial(fn, *args, **kwargs))
+
+async def generate_cosmic_seed(bytes: int = 16, fallback: bool = True,
+                               pool: Optional[EntropyPool] = None, timeout: Optional[float] = None,
+                               executor: Optional[Executor] = None) -> Tuple[int, bool]:
+    """Async generate_cosmic_seed."""
+    return await _offload(executor, cosmic_cipher.generate_cosmic_seed, bytes, fallback, pool, timeout)
+
+async def encrypt_authenticated(message: str, key: int, iv: Optional[int] = None,
+                                executor: Optional[Executor] = None,
+                                **options) -> Dict[str, Union[str, int]]:
+    """Async encrypt_authenticated; options are passed through."""
+    return await _offload(executor, cosmic_cipher.encrypt_authenticated, message, key, iv, **options)
+
+async def decrypt_authenticated(encrypted: Dict[str, Union[str, int]], key: int,
+                                executor: Optional[Executor] = None) -> str:
+    """Async decrypt_authenticated."""
+    return await _offload(executor, cosmic_cipher.decrypt_authenticated, encrypted, key)
+
+async def encrypt_authenticated_bytes(message: Union[bytes, bytearray, memoryview], key: int,
+                                      iv: Optional[int] = None, executor: Optional[Executor] = None,
+                                      **options) -> bytes:
+    """Async encrypt_authenticated_bytes; options are passed through."""
+    return await _offload(executor, cosmic_cipher.encrypt_authenticated_bytes, message, key, iv, **options)
+
+async def decrypt_authenticated_bytes(data: Union[bytes, bytearray, memoryview], key: int,
+                                      executor: Optional[Executor] = None) -> bytes:
+    """Async decrypt_authenticated_bytes."""
+    return await _offload(executor, cosmic_cipher.decrypt_authenticated_bytes, data, key)
+
+async def encrypt_file(src_path: str, dst_path: str, key: int, iv: Optional[int] = None,
+                       executor: Optional[Executor] = None, **options) -> Dict[str, float]:
+    """Async file_cipher.encrypt_file; options are passed through."""
+    return await _offload(executor, file_cipher.encrypt_file, src_path, dst_path, key, iv, **options)
+
+async def decrypt_file(src_path: str, dst_path: str, key: int,
+                       executor: Optional[Executor] = None, **options) -> Dict[str, float]:
+    """Async file_cipher.decrypt_file; options are passed through."""
+    return await _offload(executor, file_cipher.decrypt_file, src_path, dst_path, key, **options)
+
+async def encrypt_stream(reader, writer, key: int, iv: Optional[int] = None,
+                         a: float = 1.4, b: float = 0.3,
+                         chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE,
+                         executor: Optional[Executor] = None) -> int:
+    """Encrypt everything read from reader into the chunked stream format on writer.
+
+    reader needs an async read(n) returning b'' at EOF (e.g. an
+    asyncio.StreamReader); writer needs write() and an async drain() (e.g.
+    an asyncio.StreamWriter). One chunk is read at a time and drain() is
+    awaited after every write, so a slow consumer slows reading instead of
+    growing buffers. Returns the number of plaintext bytes consumed.
+    """
+    encryptor = await _offload(executor, StreamEncryptor, key, iv, a, b, chunk_size)
+    writer.write(encryptor.header)
+    total = 0
+    while True:
+        data = await reader.read(chunk_size)
+        if not data:
+            break
+        total += len(data)
+        out = await _offload(executor, encryptor.update, data)
+        if out:
+            writer.write(out)
+            await writer.drain()
+    writer.write(await _offload(executor, encryptor.finalize))
+    await writer.drain()
+    return total
+
+async def decrypt_stream(reader, writer, key: int, read_size: int = DEFAULT_STREAM_CHUNK_SIZE,
+                         executor: Optional[Executor] = None,
+                         max_chunk_size: int = MAX_STREAM_CHUNK_SIZE) -> int:
+    """Verify and decrypt a chunked stream from reader, writing plaintext to writer.
+
+    Each chunk is written as soon as its MAC verifies, with drain() awaited
+    in between; ValueError is raised at the first bad chunk or if the
+    stream ends early. Returns the number of plaintext bytes written.
+    """
+    decryptor = StreamDecryptor(key, max_chunk_size)
+    total = 0
+    while True:
+        data = await reader.read(read_size)
+        if not data:
+            break
+        for plaintext in await _offload(executor, decryptor.update, data):
+            writer.write(plaintext)
+            total += len(plaintext)
+            await writer.drain()
+    decryptor.finalize()
+    return total
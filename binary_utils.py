@@ -1,8 +1,33 @@
+from typing import Union
+import numpy as np
+
+def bytes_to_bits(data: Union[bytes, bytearray, memoryview, np.ndarray]) -> str:
+    """Expand bytes into a '0'/'1' string, MSB first."""
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+    return (bits + ord('0')).tobytes().decode('ascii')
+
+def bits_to_bytes(binary: str, keep_partial: bool = False) -> np.ndarray:
+    """Pack a '0'/'1' string into uint8.
+
+    A trailing group of fewer than 8 bits is dropped, or with keep_partial
+    becomes a final byte holding its value (as int(group, 2) would).
+    """
+    try:
+        bits = np.frombuffer(binary.encode('ascii'), dtype=np.uint8) - ord('0')
+    except UnicodeEncodeError:
+        raise ValueError("Invalid binary string") from None
+    if np.any(bits > 1):
+        raise ValueError("Invalid binary string")
+    partial = len(bits) % 8
+    packed = np.packbits(bits[:len(bits) - partial])
+    if keep_partial and partial:
+        packed = np.append(packed, np.uint8(int(binary[-partial:], 2)))
+    return packed
+
 def text_to_binary(text):
     """Convert text to binary string using UTF-8 encoding."""
-    return ''.join(format(byte, '08b') for byte in text.encode('utf-8'))
+    return bytes_to_bits(text.encode('utf-8'))
 
 def binary_to_text(binary):
     """Convert binary string back to text using UTF-8 decoding."""
-    byte_list = [int(binary[i:i+8], 2) for i in range(0, len(binary), 8)]
-    return bytes(byte_list).decode('utf-8', errors='replace')
+    return bits_to_bytes(binary, keep_partial=True).tobytes().decode('utf-8', errors='replace')
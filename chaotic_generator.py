@@ -1,13 +1,30 @@
 import numpy as np
 import hashlib
-from typing import Tuple, Optional, List, Union
+import struct
+from typing import Tuple, Optional, List, Union, Iterator
 try:
-    from numba import jit
+    from numba import njit
     NUMBA_AVAILABLE = True
 except ImportError:
     NUMBA_AVAILABLE = False
 
-def check_sequence_quality(sequence: np.ndarray) -> bool:
+def autocorrelation(sequence: np.ndarray, method: str = 'fft') -> np.ndarray:
+    """Raw autocorrelation of sequence for lags 0..len(sequence)-1.
+
+    'fft' runs in O(n log n); 'direct' uses np.correlate and is O(n^2).
+    """
+    sequence = np.asarray(sequence, dtype=np.float64)
+    n = len(sequence)
+    if method == 'direct':
+        return np.correlate(sequence, sequence, mode='full')[n - 1:]
+    if method != 'fft':
+        raise ValueError(f"Unknown autocorrelation method '{method}'")
+    # Zero-pad to avoid circular wrap-around
+    nfft = 1 << (2 * n - 1).bit_length()
+    spectrum = np.fft.rfft(sequence, nfft)
+    return np.fft.irfft(spectrum * np.conj(spectrum), nfft)[:n]
+
+def check_sequence_quality(sequence: np.ndarray, method: str = 'fft') -> bool:
     """Perform basic statistical checks on sequence."""
     if len(sequence) < 1000:
         return False
@@ -18,54 +35,580 @@ def check_sequence_quality(sequence: np.ndarray) -> bool:
     if hist_std > np.mean(hist) * 0.5:  # Allow 50% variation
         return False
     
-    # Check autocorrelation
-    auto_corr = np.correlate(sequence, sequence, mode='full')
-    peak = auto_corr[len(sequence)]
-    if np.any(auto_corr[len(sequence)+1:] > peak * 0.7):  # Max 70% correlation
+    # Check autocorrelation against the zero-lag peak
+    auto_corr = autocorrelation(sequence, method)
+    peak = auto_corr[0]
+    if np.any(auto_corr[1:] > peak * 0.7):  # Max 70% correlation
         return False
     
     return True
 
+class SequenceQualityMonitor:
+    """Apply check_sequence_quality window by window as a sequence is generated.
+
+    Feed chunks of any size to update(); each time window values have
+    accumulated they are checked, and the first failing window raises
+    ValueError so generation can stop early.
+    """
+
+    def __init__(self, window: int = 4096, method: str = 'fft'):
+        if window < 1000:
+            raise ValueError("window must hold at least 1000 values")
+        self.window = window
+        self.method = method
+        self.windows_checked = 0
+        self.failed = False
+        self._buffer = np.empty(window)
+        self._filled = 0
+
+    def update(self, chunk: np.ndarray) -> None:
+        """Add generated values, checking every completed window."""
+        if self.failed:
+            raise ValueError("Generated sequence failed quality checks")
+        chunk = np.asarray(chunk, dtype=np.float64)
+        start = 0
+        while start < len(chunk):
+            take = min(self.window - self._filled, len(chunk) - start)
+            self._buffer[self._filled:self._filled + take] = chunk[start:start + take]
+            self._filled += take
+            start += take
+            if self._filled == self.window:
+                self._filled = 0
+                self.windows_checked += 1
+                if not check_sequence_quality(self._buffer, self.method):
+                    self.failed = True
+                    raise ValueError("Generated sequence failed quality checks")
+
+def _henon_fill_python(out: np.ndarray, x: float, y: float, a: float, b: float) -> Tuple[float, float]:
+    """Reference Hénon iteration; writes x values into out and returns the final state.
+
+    Squares by multiplication rather than x**2, which goes through the
+    platform libm pow and is not correctly rounded everywhere.
+    """
+    for i in range(len(out)):
+        x_next = 1 - a * (x * x) + y
+        y_next = b * x
+        x, y = x_next, y_next
+        out[i] = x
+    return x, y
+
+_KERNELS = {'python': _henon_fill_python}
+
 if NUMBA_AVAILABLE:
-    @jit(nopython=True)
-    def _henon_iterate(x0: float, y0: float, a: float, b: float, length: int) -> np.ndarray:
-        """Optimized Hénon map iteration."""
-        sequence = np.zeros(length)
-        x, y = x0, y0
-        for i in range(length):
-            x_next = 1 - a * x**2 + y
+    # Eager signature plus on-disk cache: compiled once, then loaded by later
+    # processes. nogil lets background threads generate alongside the caller.
+    _KERNELS['numba'] = njit(
+        'UniTuple(float64, 2)(float64[::1], float64, float64, float64, float64)',
+        cache=True, nogil=True
+    )(_henon_fill_python)
+
+HENON_BACKEND = 'numba' if NUMBA_AVAILABLE else 'python'
+
+def henon_backend() -> str:
+    """Name of the Hénon kernel used when no backend is requested."""
+    return HENON_BACKEND
+
+def available_backends() -> List[str]:
+    """Hénon kernels usable in this process, preferred first."""
+    return sorted(_KERNELS, key=lambda name: name != HENON_BACKEND)
+
+def henon_fill(out: np.ndarray, x: float, y: float, a: float, b: float,
+               backend: Optional[str] = None) -> Tuple[float, float]:
+    """Fill out with Hénon iterates from (x, y) and return the final state.
+
+    All backends produce bit-identical output; an orbit that escapes to
+    infinity raises OverflowError regardless of backend.
+    """
+    backend = backend or HENON_BACKEND
+    if backend not in _KERNELS:
+        raise ValueError(f"Hénon backend '{backend}' is not available")
+    x, y = _KERNELS[backend](out, float(x), float(y), float(a), float(b))
+    if not np.isfinite(x):
+        raise OverflowError("Hénon orbit diverged for this seed")
+    return x, y
+
+def _henon_rows_python(out: np.ndarray, x0: np.ndarray, y0: np.ndarray,
+                       lengths: np.ndarray, a: float, b: float) -> None:
+    """Reference batch kernel: row j of out gets lengths[j] iterates from (x0[j], y0[j])."""
+    for j in range(out.shape[0]):
+        x, y = x0[j], y0[j]
+        for i in range(lengths[j]):
+            x_next = 1 - a * (x * x) + y
             y_next = b * x
             x, y = x_next, y_next
-            sequence[i] = x
-        return sequence
+            out[j, i] = x
+
+def _henon_rows_numpy(out: np.ndarray, x0: np.ndarray, y0: np.ndarray,
+                      lengths: np.ndarray, a: float, b: float) -> None:
+    """Iterate all rows together as NumPy vectors, one step per loop.
+
+    Rows are processed longest first so the active ones at each step form
+    a prefix; every row stays bit-identical to the scalar kernels. Steps
+    are staged in blocks of about 2**20 values before being copied out.
+    """
+    if not len(lengths):
+        return
+    order = np.argsort(-lengths, kind='stable')
+    sorted_lengths = lengths[order]
+    x = x0[order].astype(np.float64)
+    y = y0[order].astype(np.float64)
+    total = int(sorted_lengths[0])
+    steps = np.empty((min(total, max(1, (1 << 20) // len(order))), len(order)))
+    active = len(order)
+    with np.errstate(over='ignore', invalid='ignore'):
+        for start in range(0, total, len(steps)):
+            block = steps[:min(len(steps), total - start)]
+            # Rows that have finished keep the zeros henon_batch pads with
+            block.fill(0)
+            for i in range(len(block)):
+                while sorted_lengths[active - 1] <= start + i:
+                    active -= 1
+                xa = x[:active]
+                x_next = 1 - a * (xa * xa) + y[:active]
+                y[:active] = b * xa
+                x[:active] = x_next
+                block[i, :active] = x_next
+            out[order, start:start + len(block)] = block.T
+
+_BATCH_KERNELS = {'python': _henon_rows_numpy}
+
+# Largest henon_batch output, in float64 values (512 MiB)
+MAX_BATCH_ELEMENTS = 1 << 26
+
+if NUMBA_AVAILABLE:
+    _BATCH_KERNELS['numba'] = njit(
+        'void(float64[:, ::1], float64[::1], float64[::1], int64[::1], float64, float64)',
+        cache=True, nogil=True
+    )(_henon_rows_python)
+
+def _henon_lanes_python(out: np.ndarray, x: np.ndarray, y: np.ndarray,
+                        a: float, b: float) -> None:
+    """Reference lane kernel: advance all lanes one step per row of out.
+
+    out has shape (steps, lanes), so its flattened form interleaves the
+    lanes. x and y hold the lane states and are updated in place.
+    """
+    for i in range(out.shape[0]):
+        for k in range(out.shape[1]):
+            x_next = 1 - a * (x[k] * x[k]) + y[k]
+            y[k] = b * x[k]
+            x[k] = x_next
+            out[i, k] = x_next
+
+def _henon_lanes_numpy(out: np.ndarray, x: np.ndarray, y: np.ndarray,
+                       a: float, b: float) -> None:
+    """Advance all lanes together as NumPy vectors, one step per loop.
+
+    Per-step NumPy overhead only pays off across many lanes; with few
+    lanes each one runs through the scalar loop instead.
+    """
+    if out.shape[1] < 32:
+        column = np.empty(out.shape[0])
+        for k in range(out.shape[1]):
+            x[k], y[k] = _henon_fill_python(column, x[k], y[k], a, b)
+            out[:, k] = column
+        return
+    for i in range(out.shape[0]):
+        x_next = 1 - a * (x * x) + y
+        y[:] = b * x
+        x[:] = x_next
+        out[i] = x_next
+
+_LANE_KERNELS = {'python': _henon_lanes_numpy}
+
+if NUMBA_AVAILABLE:
+    _LANE_KERNELS['numba'] = njit(
+        'void(float64[:, ::1], float64[::1], float64[::1], float64, float64)',
+        cache=True, nogil=True
+    )(_henon_lanes_python)
+
+def henon_lanes(out: np.ndarray, x: np.ndarray, y: np.ndarray, a: float, b: float,
+                backend: Optional[str] = None) -> None:
+    """Fill an (steps, lanes) array with interleaved iterates of independent lanes.
+
+    Lane states in x and y are advanced in place. Every lane is
+    bit-identical to henon_fill from the same initial condition; if any
+    lane diverges OverflowError is raised.
+    """
+    backend = backend or HENON_BACKEND
+    if backend not in _LANE_KERNELS:
+        raise ValueError(f"Hénon backend '{backend}' is not available")
+    with np.errstate(over='ignore', invalid='ignore'):
+        _LANE_KERNELS[backend](out, x, y, float(a), float(b))
+    if not np.isfinite(x).all():
+        raise OverflowError("Hénon orbit diverged for this seed")
+
+def henon_batch(x0: np.ndarray, y0: np.ndarray, lengths: np.ndarray,
+                a: float = 1.4, b: float = 0.3, backend: Optional[str] = None) -> np.ndarray:
+    """Iterate one Hénon map per initial condition.
+
+    Returns an (N, max(lengths)) array whose row j holds lengths[j] iterates
+    followed by zeros. Rows are bit-identical to henon_fill on any backend;
+    a diverged orbit is left as non-finite values rather than raising.
+
+    The array is dense, so rows of very different lengths waste the
+    padding; group them by length first. Calls needing more than
+    MAX_BATCH_ELEMENTS values raise ValueError.
+    """
+    backend = backend or HENON_BACKEND
+    if backend not in _BATCH_KERNELS:
+        raise ValueError(f"Hénon backend '{backend}' is not available")
+    x0 = np.ascontiguousarray(x0, dtype=np.float64)
+    y0 = np.ascontiguousarray(y0, dtype=np.float64)
+    lengths = np.ascontiguousarray(lengths, dtype=np.int64)
+    width = int(lengths.max()) if len(lengths) else 0
+    if len(x0) * width > MAX_BATCH_ELEMENTS:
+        raise ValueError(f"Batch of {len(x0)} x {width} values exceeds "
+                         f"MAX_BATCH_ELEMENTS ({MAX_BATCH_ELEMENTS})")
+    out = np.zeros((len(x0), width))
+    with np.errstate(over='ignore', invalid='ignore'):
+        _BATCH_KERNELS[backend](out, x0, y0, lengths, float(a), float(b))
+    return out
+
+def _initial_conditions(seed: int) -> Tuple[float, float]:
+    """Derive Hénon initial conditions in [-1, 1) from a seed."""
+    seed_hash = hashlib.sha256(seed.to_bytes((seed.bit_length() + 7) // 8, 'big')).digest()
+    x0 = int.from_bytes(seed_hash[:16], 'big') / (2**128) * 2 - 1
+    y0 = int.from_bytes(seed_hash[16:], 'big') / (2**128) * 2 - 1
+    return x0, y0
+
+def _lane_conditions(seed: int, lanes: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Initial conditions of each lane, hashed from the seed and lane number.
+
+    A lane whose orbit diverges during a short warm-up is re-derived with
+    the next attempt counter, so every lane starts on the attractor.
+    """
+    seed_bytes = seed.to_bytes((seed.bit_length() + 7) // 8, 'big')
+    x, y = np.empty(lanes), np.empty(lanes)
+    pending = list(range(lanes))
+    attempt = 0
+    while pending:
+        conditions = np.array([
+            _initial_conditions(int.from_bytes(hashlib.sha256(
+                seed_bytes + lane.to_bytes(4, 'big') + attempt.to_bytes(4, 'big')).digest(), 'big'))
+            for lane in pending
+        ])
+        warmup = henon_batch(conditions[:, 0], conditions[:, 1], np.full(len(pending), 128))
+        bounded = np.isfinite(warmup[:, -1])
+        for lane, (x0, y0), ok in zip(pending, conditions, bounded):
+            if ok:
+                x[lane], y[lane] = x0, y0
+        pending = [lane for lane, ok in zip(pending, bounded) if not ok]
+        attempt += 1
+    return x, y
+
+def _check_parameters(a: float, b: float) -> None:
+    """Reject Hénon parameters outside the chaotic range."""
+    if not (1.07 <= a <= 1.4 and 0.2 <= b <= 0.3):
+        raise ValueError("Parameters outside chaotic range")
+
+def quantize_sequence(sequence: np.ndarray, bits_per_value: int = 8) -> np.ndarray:
+    """Scale the fractional part of each value to a bits_per_value integer."""
+    sequence = np.asarray(sequence, dtype=np.float64)
+    fractional = np.abs(sequence - np.trunc(sequence))
+    return (fractional * 2**bits_per_value).astype(np.uint64)
+
+# Keystream extraction modes, in the order of their envelope codes
+EXTRACTION_MODES = ('fractional', 'mantissa', 'whitened')
+
+# The lowest mantissa bits keep rounding artefacts (cancellation in
+# 1 - a*x*x + y leaves trailing zeros) and the highest follow the value
+# itself, so mantissa extraction takes the bits in between.
+MANTISSA_SKIP_BITS = 4
+MAX_MANTISSA_BITS = 32
+WHITEN_BLOCK_SIZE = 4096
+
+def extract_mantissa_bits(sequence: np.ndarray, bits_per_value: int = 32) -> np.ndarray:
+    """Pack bits_per_value mantissa bits of each iterate into a uint8 keystream.
+
+    Bits are taken MSB first from just above the MANTISSA_SKIP_BITS lowest
+    bits; a trailing partial byte is dropped.
+    """
+    if not 1 <= bits_per_value <= MAX_MANTISSA_BITS:
+        raise ValueError(f"bits_per_value must be between 1 and {MAX_MANTISSA_BITS}")
+    raw = np.ascontiguousarray(sequence, dtype=np.float64).view(np.uint64)
+    values = (raw >> np.uint64(MANTISSA_SKIP_BITS)) & np.uint64((1 << bits_per_value) - 1)
+    if bits_per_value % 8 == 0:
+        nbytes = bits_per_value // 8
+        return values.astype('>u8').view(np.uint8).reshape(-1, 8)[:, 8 - nbytes:].ravel()
+    shifts = np.arange(bits_per_value - 1, -1, -1, dtype=np.uint64)
+    bits = ((values[:, None] >> shifts) & np.uint64(1)).astype(np.uint8).ravel()
+    return np.packbits(bits[:len(bits) - len(bits) % 8])
+
+def whiten_blocks(data: np.ndarray, block_size: int = WHITEN_BLOCK_SIZE) -> np.ndarray:
+    """Replace each block with SHAKE-256 of the block index and the block."""
+    if block_size < 1:
+        raise ValueError("block_size must be positive")
+    data = np.ascontiguousarray(data, dtype=np.uint8)
+    if len(data) % block_size:
+        raise ValueError("data must be a whole number of blocks")
+    out = np.empty_like(data)
+    for index, start in enumerate(range(0, len(data), block_size)):
+        shake = hashlib.shake_256(index.to_bytes(8, 'big'))
+        shake.update(data[start:start + block_size])
+        out[start:start + block_size] = np.frombuffer(shake.digest(block_size), dtype=np.uint8)
+    return out
 
 def generate_stellar_sequence(
     seed: int,
     length: int = 10000,
     a: float = 1.4,
     b: float = 0.3,
-    quality_check: bool = False
+    quality_check: bool = False,
+    backend: Optional[str] = None,
+    lanes: int = 1
 ) -> np.ndarray:
-    """Generate chaotic sequence using Hénon map."""
-    if not (1.07 <= a <= 1.4 and 0.2 <= b <= 0.3):
-        raise ValueError("Parameters outside chaotic range")
+    """Generate chaotic sequence using Hénon map.
+
+    With lanes > 1 the seed is expanded into that many independent Hénon
+    maps whose iterates are interleaved (lane 0, lane 1, ..., lane 0, ...),
+    so consecutive values no longer depend on each other.
+    """
+    _check_parameters(a, b)
+    if lanes < 1:
+        raise ValueError("lanes must be at least 1")
+    if lanes > 1:
+        x, y = _lane_conditions(seed, lanes)
+        steps = np.empty(((length + lanes - 1) // lanes, lanes))
+        henon_lanes(steps, x, y, a, b, backend)
+        sequence = steps.reshape(-1)[:length].copy()
+        if quality_check and not check_sequence_quality(sequence):
+            raise ValueError("Generated sequence failed quality checks")
+        return sequence
     
     # Generate initial conditions from seed
-    seed_hash = hashlib.sha256(seed.to_bytes((seed.bit_length() + 7) // 8, 'big')).digest()
-    x0 = int.from_bytes(seed_hash[:16], 'big') / (2**128) * 2 - 1
-    y0 = int.from_bytes(seed_hash[16:], 'big') / (2**128) * 2 - 1
+    x0, y0 = _initial_conditions(seed)
     
     # Generate sequence
-    x, y = x0, y0
     sequence = np.zeros(length)
+    if not quality_check:
+        henon_fill(sequence, x0, y0, a, b, backend)
+        return sequence
     
-    for i in range(length):
-        x_next = 1 - a * x**2 + y
-        y_next = b * x
-        x, y = x_next, y_next
-        sequence[i] = x
+    # Check window by window so a bad sequence is abandoned early
+    monitor = SequenceQualityMonitor()
+    x, y = x0, y0
+    for start in range(0, length, monitor.window):
+        block = sequence[start:start + monitor.window]
+        x, y = henon_fill(block, x, y, a, b, backend)
+        monitor.update(block)
     
-    if quality_check and not check_sequence_quality(sequence):
+    if not check_sequence_quality(sequence):
         raise ValueError("Generated sequence failed quality checks")
     
     return sequence
+
+def generate_stellar_batch(
+    seeds: List[int],
+    length: int = 10000,
+    a: float = 1.4,
+    b: float = 0.3,
+    backend: Optional[str] = None,
+    allow_divergence: bool = False
+) -> np.ndarray:
+    """Generate chaotic sequences for many seeds at once as an (N, length) array.
+
+    Row j equals generate_stellar_sequence(seeds[j], length, a, b). Diverged
+    rows raise OverflowError unless allow_divergence is set, in which case
+    they are returned with non-finite values.
+    """
+    _check_parameters(a, b)
+    if not len(seeds):
+        return np.empty((0, length))
+    conditions = np.array([_initial_conditions(seed) for seed in seeds]).reshape(-1, 2)
+    sequences = henon_batch(conditions[:, 0], conditions[:, 1],
+                            np.full(len(seeds), length), a, b, backend)
+    if not allow_divergence and length and not np.isfinite(sequences[:, -1]).all():
+        diverged = int(np.count_nonzero(~np.isfinite(sequences[:, -1])))
+        raise OverflowError(f"Hénon orbit diverged for {diverged} of {len(seeds)} seeds")
+    return sequences
+
+class HenonStream:
+    """Resumable Hénon keystream that keeps only the current (x, y) state.
+
+    Keystream bytes match chaotic_to_keystream_bytes(generate_stellar_sequence(seed, n))
+    for the default 8 bits per value, but are produced chunk by chunk through a
+    fixed scratch buffer so memory use does not grow with the stream length.
+
+    With checkpoint_interval set, the state is recorded every that many
+    iterates and index() returns a KeystreamIndex for random access. A
+    quality_monitor is fed every generated iterate and aborts the stream
+    with ValueError at the first failing window.
+    """
+    _STATE_MAGIC = b'HNS1'
+    _STATE_FORMAT = '>4sddddQ'
+
+    def __init__(self, seed: int, a: float = 1.4, b: float = 0.3,
+                 chunk_size: int = 65536, backend: Optional[str] = None,
+                 checkpoint_interval: Optional[int] = None,
+                 quality_monitor: Optional[SequenceQualityMonitor] = None):
+        _check_parameters(a, b)
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+        if checkpoint_interval is not None and checkpoint_interval < 1:
+            raise ValueError("checkpoint_interval must be positive")
+        self.a = a
+        self.b = b
+        self.chunk_size = chunk_size
+        self.backend = backend
+        self.checkpoint_interval = checkpoint_interval
+        self.quality_monitor = quality_monitor
+        self.x, self.y = _initial_conditions(seed)
+        self.position = 0
+        self._checkpoints = [(self.x, self.y)]
+        self._scratch = np.empty(chunk_size)
+
+    def read_sequence(self, count: int) -> np.ndarray:
+        """Return the next count Hénon iterates and advance the state."""
+        sequence = np.empty(count)
+        self._fill(sequence)
+        return sequence
+
+    def read(self, count: int) -> np.ndarray:
+        """Return the next count keystream bytes as a uint8 array."""
+        keystream = np.empty(count, dtype=np.uint8)
+        for start in range(0, count, self.chunk_size):
+            block = self._scratch[:min(self.chunk_size, count - start)]
+            self._fill(block)
+            keystream[start:start + len(block)] = quantize_sequence(block)
+        return keystream
+
+    def skip(self, count: int) -> None:
+        """Advance the state by count iterates without producing output."""
+        for start in range(0, count, self.chunk_size):
+            self._fill(self._scratch[:min(self.chunk_size, count - start)])
+
+    def seek(self, position: int, index: Optional['KeystreamIndex'] = None) -> None:
+        """Move to an absolute keystream position.
+
+        Forward seeks iterate from the current state; with an index the
+        stream first jumps to the nearest checkpoint at or before position,
+        which also allows seeking backwards.
+        """
+        if position < 0:
+            raise ValueError("position must be non-negative")
+        if index is not None:
+            if (index.a, index.b) != (self.a, self.b):
+                raise ValueError("Index was built with different Hénon parameters")
+            slot = min(position // index.interval, len(index.checkpoints) - 1)
+            start = slot * index.interval
+            if start > self.position or position < self.position:
+                self.x, self.y = (float(v) for v in index.checkpoints[slot])
+                self.position = start
+        if position < self.position:
+            raise ValueError("Cannot seek backwards without a checkpoint index")
+        self.skip(position - self.position)
+
+    def index(self) -> 'KeystreamIndex':
+        """Checkpoints recorded so far; requires checkpoint_interval."""
+        if not self.checkpoint_interval:
+            raise ValueError("Stream was created without a checkpoint_interval")
+        return KeystreamIndex(self.a, self.b, self.checkpoint_interval,
+                              np.array(self._checkpoints))
+
+    def chunks(self, total: Optional[int] = None) -> Iterator[np.ndarray]:
+        """Yield chunk_size keystream chunks, up to total bytes if given."""
+        remaining = total
+        while remaining is None or remaining > 0:
+            size = self.chunk_size if remaining is None else min(self.chunk_size, remaining)
+            yield self.read(size)
+            if remaining is not None:
+                remaining -= size
+
+    def state(self) -> bytes:
+        """Serialize the generator state so a job can be resumed later."""
+        return struct.pack(self._STATE_FORMAT, self._STATE_MAGIC,
+                           self.x, self.y, self.a, self.b, self.position)
+
+    @classmethod
+    def from_state(cls, state: bytes, chunk_size: int = 65536,
+                   backend: Optional[str] = None) -> 'HenonStream':
+        """Rebuild a stream from bytes produced by state()."""
+        try:
+            magic, x, y, a, b, position = struct.unpack(cls._STATE_FORMAT, state)
+        except struct.error:
+            raise ValueError("Invalid Hénon stream state")
+        if magic != cls._STATE_MAGIC:
+            raise ValueError("Invalid Hénon stream state")
+        stream = cls(0, a, b, chunk_size, backend)
+        stream.x, stream.y, stream.position = x, y, position
+        stream._checkpoints = []
+        return stream
+
+    def _fill(self, out: np.ndarray) -> None:
+        interval = self.checkpoint_interval
+        if not interval:
+            self.x, self.y = henon_fill(out, self.x, self.y, self.a, self.b, self.backend)
+            self.position += len(out)
+        else:
+            self._fill_with_checkpoints(out, interval)
+        if self.quality_monitor is not None:
+            self.quality_monitor.update(out)
+
+    def _fill_with_checkpoints(self, out: np.ndarray, interval: int) -> None:
+        # Split at checkpoint boundaries so the state there can be recorded
+        start = 0
+        while start < len(out):
+            block = out[start:start + interval - self.position % interval]
+            self.x, self.y = henon_fill(block, self.x, self.y, self.a, self.b, self.backend)
+            self.position += len(block)
+            start += len(block)
+            if self.position == len(self._checkpoints) * interval:
+                self._checkpoints.append((self.x, self.y))
+
+class KeystreamIndex:
+    """Hénon (x, y) checkpoints taken every interval iterates of one keystream.
+
+    Sixteen bytes per checkpoint; store it alongside the ciphertext or
+    rebuild it from the seed with build().
+    """
+    _MAGIC = b'HNX1'
+    _HEADER = '>4sddQQ'
+
+    def __init__(self, a: float, b: float, interval: int, checkpoints: np.ndarray):
+        if interval < 1:
+            raise ValueError("interval must be positive")
+        self.a = a
+        self.b = b
+        self.interval = interval
+        self.checkpoints = np.asarray(checkpoints, dtype=np.float64).reshape(-1, 2)
+        if not len(self.checkpoints):
+            raise ValueError("Index needs at least one checkpoint")
+
+    @classmethod
+    def build(cls, seed: int, length: int, interval: int = 65536,
+              a: float = 1.4, b: float = 0.3,
+              backend: Optional[str] = None) -> 'KeystreamIndex':
+        """Regenerate the index covering the first length iterates for seed."""
+        stream = HenonStream(seed, a, b, backend=backend, checkpoint_interval=interval)
+        stream.skip(length)
+        return stream.index()
+
+    def stream_at(self, position: int, chunk_size: int = 65536,
+                  backend: Optional[str] = None) -> HenonStream:
+        """Return a HenonStream positioned at position."""
+        stream = HenonStream(0, self.a, self.b, chunk_size, backend)
+        stream.x, stream.y = (float(v) for v in self.checkpoints[0])
+        stream._checkpoints = []
+        stream.seek(position, self)
+        return stream
+
+    def to_bytes(self) -> bytes:
+        """Serialize to a compact big-endian binary form."""
+        header = struct.pack(self._HEADER, self._MAGIC, self.a, self.b,
+                             self.interval, len(self.checkpoints))
+        return header + self.checkpoints.astype('>f8').tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, bytearray, memoryview]) -> 'KeystreamIndex':
+        """Parse bytes produced by to_bytes()."""
+        view = memoryview(data)
+        size = struct.calcsize(cls._HEADER)
+        try:
+            magic, a, b, interval, count = struct.unpack(cls._HEADER, view[:size])
+        except struct.error:
+            raise ValueError("Invalid keystream index")
+        if magic != cls._MAGIC or len(view) != size + count * 16:
+            raise ValueError("Invalid keystream index")
+        checkpoints = np.frombuffer(view[size:], dtype='>f8').astype(np.float64)
+        return cls(a, b, interval, checkpoints)
@@ -0,0 +1,371 @@
+import argparse
+import asyncio
+import os
+import queue
+import socket
+import struct
+import sys
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+from binary_utils import bits_to_bytes, bytes_to_bits
+from cosmic_cipher import encrypt_many, decrypt_many
+
+# Frames in both directions: op (requests) or status (responses), request id,
+# payload length, then the payload.
+#   encrypt request:  key (32 bytes) + UTF-8 message
+#   encrypt response: iv (16) + mac (32) + packed ciphertext
+#   decrypt request:  key (32) + iv (16) + mac (32) + packed ciphertext
+#   decrypt response: UTF-8 plaintext
+#   error response:   UTF-8 error message
+FRAME_FORMAT = '>BII'
+FRAME_SIZE = struct.calcsize(FRAME_FORMAT)
+MAX_PAYLOAD = 64 * 1024 * 1024
+OP_ENCRYPT = 1
+OP_DECRYPT = 2
+STATUS_OK = 0
+STATUS_VALUE_ERROR = 1
+STATUS_ERROR = 2
+
+def _frame(code: int, request_id: int, payload: bytes) -> bytes:
+    return struct.pack(FRAME_FORMAT, code, request_id, len(payload)) + payload
+
+def _pack_encrypted(encrypted: Dict[str, Union[str, int]]) -> bytes:
+    """iv + mac + packed ciphertext of a default-option encrypt_authenticated output."""
+    if (encrypted.get('lanes', 1), encrypted.get('extraction', 'fractional'),
+            encrypted.get('bits_per_value', 8), encrypted.get('mac_mode', 'bits')) != (1, 'fractional', 8, 'bits'):
+        raise ValueError("The daemon only handles default keystream and MAC options")
+    if len(encrypted['ciphertext']) % 8:
+        raise ValueError("Invalid binary string")
+    return b''.join((int(encrypted['iv'], 16).to_bytes(16, 'big'), bytes.fromhex(encrypted['mac']),
+                     bits_to_bytes(encrypted['ciphertext']).tobytes()))
+
+def _unpack_encrypted(data: bytes) -> Dict[str, Union[str, int]]:
+    """Rebuild the encrypt_authenticated dict from _pack_encrypted output."""
+    if len(data) < 48:
+        raise ValueError("Encrypted payload is too short")
+    ciphertext = bytes_to_bits(data[48:])
+    return {
+        'ciphertext': ciphertext,
+        'mac': data[16:48].hex(),
+        'iv': hex(int.from_bytes(data[:16], 'big'))[2:],
+        'length': len(data) - 48,
+        'lanes': 1,
+        'extraction': 'fractional',
+        'bits_per_value': 8,
+        'mac_mode': 'bits'
+    }
+
+class _Request(NamedTuple):
+    op: int
+    request_id: int
+    key: int
+    body: bytes
+    writer: asyncio.StreamWriter
+
+class CipherDaemon:
+    """Serve encrypt/decrypt_authenticated over a Unix domain socket.
+
+    Requests from all connections go through a bounded queue; a batcher
+    collects whatever arrives within batch_window (up to max_batch
+    requests and max_batch_bytes of payload), groups it by operation and
+    key, and runs each group through encrypt_many/decrypt_many on a pool
+    of worker threads.
+
+    At most one batch per worker runs at a time, and at most
+    max_pending_bytes of payload are read but unanswered. Beyond either
+    limit the daemon stops reading from clients, so load turns into
+    backpressure instead of memory.
+    """
+
+    def __init__(self, path: str, workers: Optional[int] = None, max_batch: int = 64,
+                 batch_window: float = 0.002, max_pending: int = 1024,
+                 max_batch_bytes: int = 16 * 1024 * 1024,
+                 max_pending_bytes: int = 2 * MAX_PAYLOAD):
+        if max_batch < 1 or max_pending < 1 or batch_window < 0:
+            raise ValueError("max_batch and max_pending must be positive, batch_window non-negative")
+        if max_batch_bytes < 1 or max_pending_bytes < 1:
+            raise ValueError("max_batch_bytes and max_pending_bytes must be positive")
+        self.path = path
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.max_batch_bytes = max_batch_bytes
+        self.max_pending_bytes = max_pending_bytes
+        self.requests = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.workers = workers or min(32, (os.cpu_count() or 1) + 4)  # ThreadPoolExecutor's default
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._max_pending = max_pending
+        self._pending_bytes = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._tasks: set = set()
+
+    async def start(self) -> None:
+        """Warm up the cipher, then start listening on the socket path."""
+        loop = asyncio.get_running_loop()
+        # Pay numba cache loading and first-call costs before the first client
+        await loop.run_in_executor(self._executor, encrypt_many, ["warm-up"], 1)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=self._max_pending)
+        self._batch_slots = asyncio.Semaphore(self.workers)
+        self._space = asyncio.Condition()
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        self._batcher = asyncio.create_task(self._batch_loop())
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """Stop accepting connections and shut the worker pool down."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+        if self._batcher is not None:
+            self._batcher.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'largest_batch': self.largest_batch,
+            'pending': self._queue.qsize() if self._server is not None else 0,
+            'pending_bytes': self._pending_bytes
+        }
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                op, request_id, length = struct.unpack(FRAME_FORMAT, await reader.readexactly(FRAME_SIZE))
+                if length > MAX_PAYLOAD:
+                    writer.write(_frame(STATUS_VALUE_ERROR, request_id, b"Payload too large"))
+                    break
+                # Too much unanswered payload, or a full queue, stops reading
+                # from this client: backpressure
+                await self._reserve(length)
+                try:
+                    payload = await reader.readexactly(length)
+                    if op not in (OP_ENCRYPT, OP_DECRYPT) or length < 32:
+                        writer.write(_frame(STATUS_VALUE_ERROR, request_id, b"Malformed request"))
+                        await self._release(length)
+                        await writer.drain()
+                        continue
+                    await self._queue.put(_Request(op, request_id, int.from_bytes(payload[:32], 'big'),
+                                                   payload[32:], writer))
+                except BaseException:
+                    await self._release(length)
+                    raise
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _reserve(self, size: int) -> None:
+        """Wait until size more payload bytes fit within max_pending_bytes."""
+        async with self._space:
+            # A lone request larger than the budget still goes through
+            await self._space.wait_for(lambda: not self._pending_bytes
+                                       or self._pending_bytes + size <= self.max_pending_bytes)
+            self._pending_bytes += size
+
+    async def _release(self, size: int) -> None:
+        async with self._space:
+            self._pending_bytes -= size
+            self._space.notify_all()
+
+    async def _batch_loop(self) -> None:
+        held: Optional[_Request] = None
+        while True:
+            # Wait for a free worker before collecting, so requests queue up
+            # (and reading stalls) instead of piling into the executor
+            await self._batch_slots.acquire()
+            batch = [held if held is not None else await self._queue.get()]
+            held = None
+            size = len(batch[0].body)
+            if self.batch_window and self._queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.batch_window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                request = self._queue.get_nowait()
+                if size + len(request.body) > self.max_batch_bytes:
+                    held = request
+                    break
+                batch.append(request)
+                size += len(request.body)
+            self.requests += len(batch)
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(batch))
+            task = asyncio.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[_Request]) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            groups: Dict[Tuple[int, int], List[_Request]] = defaultdict(list)
+            for request in batch:
+                groups[request.op, request.key].append(request)
+            results = await asyncio.gather(*(loop.run_in_executor(self._executor, self._process, op, key, requests)
+                                             for (op, key), requests in groups.items()),
+                                           return_exceptions=True)
+            writers = set()
+            for requests, frames in zip(groups.values(), results):
+                if isinstance(frames, BaseException):
+                    # Every request of a failed group still gets an answer
+                    message = f"{type(frames).__name__}: {frames}".encode('utf-8')
+                    frames = [_frame(STATUS_ERROR, request.request_id, message) for request in requests]
+                for request, frame in zip(requests, frames):
+                    if not request.writer.is_closing():
+                        request.writer.write(frame)
+                        writers.add(request.writer)
+            for writer in writers:
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    pass
+        finally:
+            self._batch_slots.release()
+            await self._release(sum(len(request.body) + 32 for request in batch))
+
+    @staticmethod
+    def _process(op: int, key: int, requests: List[_Request]) -> List[bytes]:
+        """Run one group through the batch API and frame each result (worker thread)."""
+        frames: List[Optional[bytes]] = [None] * len(requests)
+        items, positions = [], []
+        for i, request in enumerate(requests):
+            try:
+                items.append(request.body.decode('utf-8') if op == OP_ENCRYPT
+                             else _unpack_encrypted(request.body))
+                positions.append(i)
+            except ValueError as e:
+                frames[i] = _frame(STATUS_VALUE_ERROR, request.request_id, str(e).encode('utf-8'))
+        results = encrypt_many(items, key) if op == OP_ENCRYPT else decrypt_many(items, key)
+        for i, result in zip(positions, results):
+            request_id = requests[i].request_id
+            if result.error is not None:
+                status = STATUS_VALUE_ERROR if isinstance(result.error, ValueError) else STATUS_ERROR
+                frames[i] = _frame(status, request_id, str(result.error).encode('utf-8'))
+            elif op == OP_ENCRYPT:
+                frames[i] = _frame(STATUS_OK, request_id, _pack_encrypted(result.value))
+            else:
+                frames[i] = _frame(STATUS_OK, request_id, result.value.encode('utf-8'))
+        return frames
+
+class CipherClient:
+    """Blocking, thread-safe client for CipherDaemon with a connection pool.
+
+    Up to pool_size connections are opened on demand and reused; each
+    carries one request at a time.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4, timeout: Optional[float] = None):
+        if pool_size < 1:
+            raise ValueError("pool_size must be positive")
+        self.path = path
+        self.timeout = timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._ids = iter(range(1, 2**32))
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        return sock
+
+    @staticmethod
+    def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Daemon closed the connection")
+            data += chunk
+        return bytes(data)
+
+    def _call(self, op: int, payload: bytes) -> bytes:
+        if self._closed:
+            raise ValueError("Client is closed")
+        with self._lock:
+            request_id = next(self._ids)
+        self._slots.acquire()
+        try:
+            try:
+                sock = self._idle.get_nowait()
+            except queue.Empty:
+                sock = self._connect()
+            try:
+                sock.sendall(_frame(op, request_id, payload))
+                status, response_id, length = struct.unpack(FRAME_FORMAT, self._recv_exactly(sock, FRAME_SIZE))
+                body = self._recv_exactly(sock, length)
+            except BaseException:
+                sock.close()
+                raise
+            if response_id != request_id:
+                sock.close()
+                raise ConnectionError("Response does not match request")
+            self._idle.put(sock)
+        finally:
+            self._slots.release()
+        if status == STATUS_VALUE_ERROR:
+            raise ValueError(body.decode('utf-8', errors='replace'))
+        if status != STATUS_OK:
+            raise RuntimeError(body.decode('utf-8', errors='replace'))
+        return body
+
+    def encrypt_authenticated(self, message: str, key: int) -> Dict[str, Union[str, int]]:
+        """Like cosmic_cipher.encrypt_authenticated, computed by the daemon."""
+        return _unpack_encrypted(self._call(OP_ENCRYPT, key.to_bytes(32, 'big') + message.encode('utf-8')))
+
+    def decrypt_authenticated(self, encrypted: Dict[str, Union[str, int]], key: int) -> str:
+        """Like cosmic_cipher.decrypt_authenticated, computed by the daemon."""
+        payload = key.to_bytes(32, 'big') + _pack_encrypted(encrypted)
+        return self._call(OP_DECRYPT, payload).decode('utf-8')
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def __enter__(self) -> 'CipherClient':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the Cosmic Cipher over a Unix domain socket")
+    parser.add_argument('socket', help="path of the Unix socket to listen on")
+    parser.add_argument('--workers', type=int, default=None, help="worker threads")
+    parser.add_argument('--max-batch', type=int, default=64, help="largest batch of requests")
+    parser.add_argument('--batch-window', type=float, default=0.002,
+                        help="seconds to wait for more requests before running a batch")
+    parser.add_argument('--max-batch-bytes', type=int, default=16 * 1024 * 1024,
+                        help="largest total payload of one batch")
+    args = parser.parse_args(argv)
+
+    daemon = CipherDaemon(args.socket, args.workers, args.max_batch, args.batch_window,
+                          max_batch_bytes=args.max_batch_bytes)
+    print(f"Serving on {args.socket}")
+    try:
+        asyncio.run(daemon.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,56 @@
 import hashlib
 import hmac
+import os
+import queue
 import secrets
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import quantumrandom as qr
 import numpy as np
-from typing import Tuple, Dict, Union
+from typing import Tuple, Dict, Union, Iterable, Iterator, Optional, List, Sequence, NamedTuple, Callable, Any
 from quantum_field_generator import QuantumFieldGenerator
 from dark_entropy_collector import DarkEntropyCollector
+from chaotic_generator import generate_stellar_sequence, quantize_sequence, HenonStream, KeystreamIndex
+from chaotic_generator import henon_batch, _initial_conditions, extract_mantissa_bits, whiten_blocks
+from chaotic_generator import EXTRACTION_MODES, WHITEN_BLOCK_SIZE, MAX_MANTISSA_BITS
+from keystream_cache import KeystreamCache
+from binary_utils import bytes_to_bits, bits_to_bytes
+from tree_mac import tree_mac
+from entropy_pool import EntropyPool
+import envelope
 
-def generate_cosmic_seed(bytes: int = 16, fallback: bool = True) -> Tuple[int, bool]:
-    """Generate quantum random seed with fallback to PRNG."""
+# Opt-in cache consulted by the authenticated functions; see enable_keystream_cache
+_keystream_cache: Optional[KeystreamCache] = None
+
+# Bits taken from each Hénon iterate when the caller does not choose
+DEFAULT_BITS_PER_VALUE = {'fractional': 8, 'mantissa': 32, 'whitened': 32}
+
+# What encrypt_authenticated MACs: the '0'/'1' ciphertext string (the
+# original format), the packed ciphertext bytes, or a BLAKE2b tree over them
+MAC_MODES = ('bits', 'bytes', 'tree')
+
+def generate_cosmic_seed(bytes: int = 16, fallback: bool = True,
+                         pool: Optional[EntropyPool] = None,
+                         timeout: Optional[float] = None) -> Tuple[int, bool]:
+    """Generate quantum random seed with fallback to PRNG.
+
+    With a pool, random bytes are drawn from its buffer instead of a
+    network call per seed, waiting up to timeout seconds for a refill.
+    The random bytes are hashed together with the dark entropy.
+    """
     if bytes < 16:
         raise ValueError("Minimum 16 bytes required for security")
+    if pool is not None and bytes > pool.capacity:
+        raise ValueError(f"Pool capacity {pool.capacity} is smaller than {bytes} bytes")
     
     quantum_used = True
     try:
-        random_bytes = qr.random_bytes(bytes)
+        if pool is not None:
+            random_bytes, quantum_used = pool.take(bytes, timeout)
+        else:
+            random_bytes = qr.random_bytes(bytes)
     except Exception:
         if not fallback:
             raise
@@ -23,95 +59,841 @@ def generate_cosmic_seed(bytes: int = 16, fallback: bool = True) -> Tuple[int, b
     
     dark_collector = DarkEntropyCollector()
     entropy = dark_collector.collect_dark_entropy(bytes * 8)
-    seed = int(hashlib.sha3_256(entropy.tobytes()).hexdigest(), 16)
+    seed = int(hashlib.sha3_256(random_bytes + entropy.tobytes()).hexdigest(), 16)
     return seed % (2**(8*bytes)), quantum_used
 
+def generate_iv(key: int, a: float = 1.4, b: float = 0.3) -> int:
+    """Draw a random 128-bit IV whose Hénon orbit for key ^ iv stays bounded.
+
+    Roughly one seed in six escapes to infinity within the first few dozen
+    iterates; those IVs are discarded after a short warm-up.
+    """
+    while True:
+        iv = secrets.randbits(128)
+        try:
+            HenonStream(key ^ iv, a, b, chunk_size=128).skip(128)
+        except OverflowError:
+            continue
+        return iv
+
 def text_to_binary(text: str) -> str:
     """Convert text to binary using UTF-8."""
-    return ''.join(format(byte, '08b') for byte in text.encode('utf-8'))
+    return bytes_to_bits(text.encode('utf-8'))
 
 def binary_to_text(binary: str) -> str:
     """Convert binary back to text using UTF-8."""
-    if not all(bit in '01' for bit in binary):
-        raise ValueError("Invalid binary string")
-    byte_list = [int(binary[i:i+8], 2) for i in range(0, len(binary), 8)]
-    return bytes(byte_list).decode('utf-8')
+    return bits_to_bytes(binary, keep_partial=True).tobytes().decode('utf-8')
 
-def chaotic_to_keystream(sequence: np.ndarray, bits_per_value: int = 8, use_quantum_field: bool = False) -> str:
-    """Convert chaotic sequence to binary keystream."""
-    if not 1 <= bits_per_value <= 32:
-        raise ValueError("bits_per_value must be between 1 and 32")
-    
+def _prepare_sequence(sequence: np.ndarray, use_quantum_field: bool) -> np.ndarray:
+    """Apply optional quantum field perturbation to a chaotic sequence."""
     if use_quantum_field:
         qfg = QuantumFieldGenerator()
         sequence = qfg.generate_quantum_potential(sequence)
         fluctuations = qfg.generate_vacuum_fluctuations(len(sequence))
         sequence += fluctuations
         sequence = sequence / np.max(np.abs(sequence))
-    
-    keystream = []
-    scale = 2**bits_per_value
-    for val in sequence:
-        fractional = abs(val - int(val))
-        byte_val = int(fractional * scale)
-        keystream.append(format(byte_val, f'0{bits_per_value}b'))
-    return ''.join(keystream)
+    return np.asarray(sequence, dtype=np.float64)
+
+def _keystream_bits(sequence: np.ndarray, bits_per_value: int) -> np.ndarray:
+    """Expand quantized values into a flat array of 0/1 bits, MSB first."""
+    values = quantize_sequence(sequence, bits_per_value)
+    shifts = np.arange(bits_per_value - 1, -1, -1, dtype=np.uint64)
+    return ((values[:, None] >> shifts) & 1).astype(np.uint8).ravel()
+
+def chaotic_to_keystream_bytes(sequence: np.ndarray, bits_per_value: int = 8,
+                               use_quantum_field: bool = False) -> np.ndarray:
+    """Convert chaotic sequence to a uint8 keystream.
+
+    Produces the same bit stream as chaotic_to_keystream, packed eight bits
+    per byte; a trailing partial byte is dropped.
+    """
+    if not 1 <= bits_per_value <= 32:
+        raise ValueError("bits_per_value must be between 1 and 32")
+
+    sequence = _prepare_sequence(sequence, use_quantum_field)
+    if bits_per_value == 8:
+        return quantize_sequence(sequence, 8).astype(np.uint8)
+    bits = _keystream_bits(sequence, bits_per_value)
+    return np.packbits(bits[:len(bits) - len(bits) % 8])
+
+def chaotic_to_keystream(sequence: np.ndarray, bits_per_value: int = 8, use_quantum_field: bool = False) -> str:
+    """Convert chaotic sequence to binary keystream."""
+    if not 1 <= bits_per_value <= 32:
+        raise ValueError("bits_per_value must be between 1 and 32")
+
+    sequence = _prepare_sequence(sequence, use_quantum_field)
+    bits = _keystream_bits(sequence, bits_per_value)
+    return (bits + ord('0')).tobytes().decode('ascii')
+
+def _as_keystream_array(keystream: Union[str, np.ndarray, bytes]) -> np.ndarray:
+    """Accept a '0'/'1' string or any byte buffer as a uint8 keystream."""
+    if isinstance(keystream, str):
+        return bits_to_bytes(keystream)
+    if isinstance(keystream, np.ndarray):
+        return keystream.astype(np.uint8, copy=False).reshape(-1)
+    return np.frombuffer(keystream, dtype=np.uint8)
+
+def encrypt_bytes(data: Union[bytes, bytearray, memoryview],
+                  keystream: Union[np.ndarray, bytes]) -> bytes:
+    """Encrypt bytes using a single vectorized XOR with the keystream."""
+    if not len(data):
+        raise ValueError("Plaintext cannot be empty")
 
-def encrypt(plaintext: str, keystream: str) -> str:
+    plain = np.frombuffer(data, dtype=np.uint8)
+    keystream = _as_keystream_array(keystream)
+    if len(keystream) < len(plain):
+        raise ValueError("Keystream too short")
+
+    return np.bitwise_xor(plain, keystream[:len(plain)]).tobytes()
+
+def decrypt_bytes(data: Union[bytes, bytearray, memoryview],
+                  keystream: Union[np.ndarray, bytes]) -> bytes:
+    """Decrypt bytes using XOR with the keystream."""
+    if not len(data):
+        raise ValueError("Ciphertext cannot be empty")
+    return encrypt_bytes(data, keystream)
+
+def _byte_view(buffer: Any, writable: bool = False) -> np.ndarray:
+    """Flat uint8 view of any C-contiguous buffer-protocol object, without copying."""
+    view = memoryview(buffer)
+    if writable and view.readonly:
+        raise ValueError("Destination buffer is read-only")
+    if not view.c_contiguous:
+        raise ValueError("Buffers must be C-contiguous")
+    return np.frombuffer(view.cast('B'), dtype=np.uint8)
+
+def encrypt_into(src: Any, dst: Any, keystream: Union[np.ndarray, bytes]) -> int:
+    """XOR src with the keystream into dst and return the number of bytes written.
+
+    src and dst may be any buffer-protocol objects (bytes, bytearray, mmap,
+    memoryview, NumPy arrays), and dst may be src itself to encrypt in place.
+    Nothing is allocated besides the views.
+    """
+    plain = _byte_view(src)
+    if not len(plain):
+        raise ValueError("Plaintext cannot be empty")
+    out = _byte_view(dst, writable=True)
+    if len(out) < len(plain):
+        raise ValueError("Destination buffer too small")
+    keystream = _as_keystream_array(keystream)
+    if len(keystream) < len(plain):
+        raise ValueError("Keystream too short")
+    np.bitwise_xor(plain, keystream[:len(plain)], out=out[:len(plain)])
+    return len(plain)
+
+def decrypt_into(src: Any, dst: Any, keystream: Union[np.ndarray, bytes]) -> int:
+    """Decrypt src into dst (or in place) with the keystream; see encrypt_into."""
+    if not len(_byte_view(src)):
+        raise ValueError("Ciphertext cannot be empty")
+    return encrypt_into(src, dst, keystream)
+
+def encrypt(plaintext: str, keystream: Union[str, np.ndarray]) -> str:
     """Encrypt plaintext using XOR with keystream."""
     if not plaintext:
         raise ValueError("Plaintext cannot be empty")
-    
-    binary = text_to_binary(plaintext)
-    if len(keystream) < len(binary):
-        raise ValueError("Keystream too short")
-    
-    return ''.join('1' if a != b else '0' 
-                  for a, b in zip(binary, keystream[:len(binary)]))
 
-def decrypt(ciphertext: str, keystream: str) -> str:
+    ciphertext = encrypt_bytes(plaintext.encode('utf-8'), _as_keystream_array(keystream))
+    return bytes_to_bits(ciphertext)
+
+def decrypt(ciphertext: str, keystream: Union[str, np.ndarray]) -> str:
     """Decrypt ciphertext using XOR with keystream."""
-    return binary_to_text(encrypt(ciphertext, keystream))
+    if len(ciphertext) % 8:
+        raise ValueError("Invalid binary string")
+    data = bits_to_bytes(ciphertext)
+    return decrypt_bytes(data, _as_keystream_array(keystream)).decode('utf-8')
 
-def encrypt_authenticated(message: str, key: int, iv: int = None) -> Dict[str, str]:
-    """Encrypt with authentication."""
-    if iv is None:
-        iv = secrets.randbits(128)
-    
-    # Generate keystream from key and IV
-    from chaotic_generator import generate_stellar_sequence
-    sequence = generate_stellar_sequence(key ^ iv, length=len(message) * 8 // 6 + 100)
-    keystream = chaotic_to_keystream(sequence)
+def encrypt_stream(chunks: Iterable[Union[bytes, bytearray, memoryview]],
+                   stream: HenonStream) -> Iterator[bytes]:
+    """Encrypt an iterable of byte chunks, drawing keystream from stream as needed."""
+    for chunk in chunks:
+        if len(chunk):
+            yield encrypt_bytes(chunk, stream.read(len(chunk)))
+
+def decrypt_stream(chunks: Iterable[Union[bytes, bytearray, memoryview]],
+                   stream: HenonStream) -> Iterator[bytes]:
+    """Decrypt an iterable of byte chunks produced by encrypt_stream."""
+    return encrypt_stream(chunks, stream)
+
+def decrypt_range(data: Union[bytes, bytearray, memoryview], offset: int,
+                  seed: Optional[int] = None, index: Optional[KeystreamIndex] = None,
+                  a: float = 1.4, b: float = 0.3) -> bytes:
+    """Decrypt ciphertext bytes that start at offset within a larger keystream.
+
+    With an index the keystream is resumed from the nearest checkpoint, so
+    the cost depends on len(data) and the index interval, not on offset.
+    """
+    if index is not None:
+        stream = index.stream_at(offset)
+    elif seed is not None:
+        stream = HenonStream(seed, a, b)
+        stream.skip(offset)
+    else:
+        raise ValueError("Either seed or index is required")
+    return decrypt_bytes(data, stream.read(len(data)))
+
+def enable_keystream_cache(max_bytes: int = 64 * 1024 * 1024) -> KeystreamCache:
+    """Cache keystreams generated by encrypt/decrypt_authenticated in memory."""
+    global _keystream_cache
+    disable_keystream_cache()
+    _keystream_cache = KeystreamCache(max_bytes)
+    return _keystream_cache
+
+def disable_keystream_cache() -> None:
+    """Drop and zero the keystream cache, if one is enabled."""
+    global _keystream_cache
+    if _keystream_cache is not None:
+        _keystream_cache.clear()
+    _keystream_cache = None
+
+def generate_keystream(seed: int, length: int, a: float = 1.4, b: float = 0.3,
+                       bits_per_value: int = 8, lanes: int = 1,
+                       extraction: str = 'fractional') -> np.ndarray:
+    """Generate a uint8 keystream from length Hénon iterates, using the cache if enabled.
+
+    'fractional' quantizes the fractional part of each iterate; 'mantissa'
+    takes bits_per_value bits straight from its mantissa, and 'whitened'
+    additionally hashes every WHITEN_BLOCK_SIZE bytes.
+    """
+    if extraction not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode '{extraction}'")
+    nbytes = length * bits_per_value // 8
+    cache = _keystream_cache
+    if cache is not None:
+        keystream = cache.get(seed, nbytes, a, b, bits_per_value, lanes, extraction)
+        if keystream is not None:
+            return keystream
+    if extraction == 'fractional':
+        sequence = generate_stellar_sequence(seed, length, a, b, lanes=lanes)
+        keystream = chaotic_to_keystream_bytes(sequence, bits_per_value)
+    else:
+        if extraction == 'whitened':
+            # Whiten whole blocks only, so shorter keystreams stay prefixes of longer ones
+            padded = -(-nbytes // WHITEN_BLOCK_SIZE) * WHITEN_BLOCK_SIZE
+            length = -(-padded * 8 // bits_per_value)
+        sequence = generate_stellar_sequence(seed, length, a, b, lanes=lanes)
+        keystream = extract_mantissa_bits(sequence, bits_per_value)
+        if extraction == 'whitened':
+            keystream = whiten_blocks(keystream[:padded])
+        keystream = keystream[:nbytes]
+    if cache is not None:
+        cache.put(seed, keystream, a, b, bits_per_value, lanes, extraction)
+    return keystream
+
+def _message_keystream(seed: int, nbytes: int, a: float = 1.4, b: float = 0.3,
+                       lanes: int = 1, extraction: str = 'fractional',
+                       bits_per_value: int = 8) -> np.ndarray:
+    """Keystream of exactly nbytes bytes, from as few iterates as the mode allows."""
+    length = -(-nbytes * 8 // bits_per_value)
+    return generate_keystream(seed, length, a, b, bits_per_value, lanes, extraction)[:nbytes]
+
+def _keystream_options(lanes: int, extraction: str, bits_per_value: Optional[int]) -> Dict[str, Any]:
+    """Validate keystream options, filling in the mode's default bits per iterate."""
+    if extraction not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode '{extraction}'")
+    # Lane counts are stored in one byte of the envelope header
+    if not 1 <= lanes <= 255:
+        raise ValueError("lanes must be between 1 and 255")
+    if bits_per_value is None:
+        bits_per_value = DEFAULT_BITS_PER_VALUE[extraction]
+    if not 1 <= bits_per_value <= MAX_MANTISSA_BITS:
+        raise ValueError(f"bits_per_value must be between 1 and {MAX_MANTISSA_BITS}")
+    return {'lanes': lanes, 'extraction': extraction, 'bits_per_value': bits_per_value}
+
+def _recorded_options(encrypted: Dict[str, Union[str, int]]) -> Dict[str, Any]:
+    """Keystream options stored in an encrypt_authenticated output; older ones lack them."""
+    return _keystream_options(int(encrypted.get('lanes', 1)),
+                              encrypted.get('extraction', 'fractional'),
+                              int(encrypted.get('bits_per_value', 8)))
+
+class KeystreamPrefetcher:
+    """Generate (IV, keystream pad) pairs for one key ahead of demand.
+
+    Worker threads draw IVs and generate pad_size-byte keystreams into a
+    bounded queue; the authenticated functions pop a ready pad and only
+    XOR and MAC on the calling thread. Use as a context manager or call
+    close() to stop the workers and zero any unused pads.
+    """
+
+    def __init__(self, key: int, pad_size: int = 4096, depth: int = 64, workers: int = 1,
+                 a: float = 1.4, b: float = 0.3, lanes: int = 1,
+                 extraction: str = 'fractional', bits_per_value: Optional[int] = None):
+        if pad_size < 1 or depth < 1 or workers < 1:
+            raise ValueError("pad_size, depth and workers must be positive")
+        self.key = key
+        self.pad_size = pad_size
+        self.a = a
+        self.b = b
+        self.options = _keystream_options(lanes, extraction, bits_per_value)
+        self.produced = 0
+        self.consumed = 0
+        self.starved = 0
+        self.oversize = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=depth)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._started = time.perf_counter()
+        self._threads = [threading.Thread(target=self._refill, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _refill(self) -> None:
+        while not self._stop.is_set():
+            iv = generate_iv(self.key, self.a, self.b)
+            pad = _message_keystream(self.key ^ iv, self.pad_size, self.a, self.b, **self.options)
+            while not self._stop.is_set():
+                try:
+                    self._queue.put((iv, pad), timeout=0.1)
+                except queue.Full:
+                    continue
+                with self._lock:
+                    self.produced += 1
+                break
+
+    def pop(self, length: int) -> Optional[Tuple[int, np.ndarray]]:
+        """Take a ready (iv, keystream) pair, or None if none fits or the queue is empty."""
+        if length > self.pad_size:
+            with self._lock:
+                self.oversize += 1
+            return None
+        try:
+            iv, pad = self._queue.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.starved += 1
+            return None
+        with self._lock:
+            self.consumed += 1
+        return iv, pad[:length]
+
+    def stats(self) -> Dict[str, float]:
+        """Queue depth, pads produced per second, and how often callers were not served."""
+        with self._lock:
+            elapsed = time.perf_counter() - self._started
+            return {
+                'depth': self._queue.qsize(),
+                'capacity': self._queue.maxsize,
+                'produced': self.produced,
+                'consumed': self.consumed,
+                'starved': self.starved,
+                'oversize': self.oversize,
+                'refill_rate': self.produced / elapsed if elapsed > 0 else 0.0
+            }
+
+    def close(self) -> None:
+        """Stop the workers and zero the pads still queued."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        while True:
+            try:
+                _, pad = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            pad.fill(0)
+
+    def __enter__(self) -> 'KeystreamPrefetcher':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def _take_pad(prefetcher: KeystreamPrefetcher, key: int,
+              nbytes: int) -> Tuple[int, np.ndarray]:
+    """Pop a prefetched pad, generating one inline if the prefetcher cannot serve."""
+    if prefetcher.key != key:
+        raise ValueError("Prefetcher was created for a different key")
+    ready = prefetcher.pop(nbytes)
+    if ready is not None:
+        return ready
+    iv = generate_iv(key, prefetcher.a, prefetcher.b)
+    return iv, _message_keystream(key ^ iv, nbytes, prefetcher.a, prefetcher.b, **prefetcher.options)
+
+# Keystream options of outputs predating lanes and extraction
+_LEGACY_OPTIONS = {'lanes': 1, 'extraction': 'fractional', 'bits_per_value': 8}
+
+def _mac_params(iv: int, length: int, options: Dict[str, Any]) -> bytes:
+    """IV, plaintext length and keystream options as bound into a message MAC."""
+    if not 0 <= iv < 2**128:
+        raise ValueError("IV must be a 128-bit non-negative integer")
+    return struct.pack('>16sQBBB', iv.to_bytes(16, 'big'), length, options['lanes'],
+                       EXTRACTION_MODES.index(options['extraction']), options['bits_per_value'])
+
+def _message_mac(key: int, ciphertext: str, iv: int, options: Dict[str, Any],
+                 mac_mode: Optional[str] = 'bits', packed: Optional[np.ndarray] = None) -> str:
+    """Hex MAC of an encrypt_authenticated ciphertext string under mac_mode.
+
+    Every MAC input starts with a tag naming its mode, followed by the IV,
+    length and options, so no mode's MAC verifies under another. A
+    mac_mode of None stands for a dict predating mac_mode: with the
+    legacy keystream options it is checked against the original untagged
+    MAC over the bit string, otherwise as 'bits'. packed, the ciphertext
+    bytes, saves re-packing the string when known.
+    """
+    key_bytes = key.to_bytes(32, 'big')
+    if mac_mode is None:
+        if options == _LEGACY_OPTIONS:
+            return hmac.new(key_bytes, ciphertext.encode(), hashlib.sha256).hexdigest()
+        mac_mode = 'bits'
+    if mac_mode not in MAC_MODES:
+        raise ValueError(f"Unknown MAC mode '{mac_mode}'")
+    mac = hmac.new(key_bytes, b'CSC-' + mac_mode.encode() + b'\0'
+                   + _mac_params(iv, len(ciphertext) // 8, options), hashlib.sha256)
+    if mac_mode == 'bits':
+        mac.update(ciphertext.encode())
+        return mac.hexdigest()
+    if packed is None:
+        if len(ciphertext) % 8:
+            raise ValueError("Invalid binary string")
+        packed = bits_to_bytes(ciphertext)
+    mac.update(packed if mac_mode == 'bytes' else tree_mac(key_bytes, packed))
+    return mac.hexdigest()
+
+def encrypt_authenticated(message: str, key: int, iv: int = None, lanes: int = 1,
+                          extraction: str = 'fractional', bits_per_value: Optional[int] = None,
+                          prefetcher: Optional[KeystreamPrefetcher] = None,
+                          mac_mode: str = 'bits') -> Dict[str, Union[str, int]]:
+    """Encrypt with authentication.
+
+    lanes > 1 draws the keystream from that many interleaved Hénon maps and
+    extraction selects how bits are taken from each iterate (see
+    generate_keystream); both are recorded in the output. With a
+    prefetcher, the IV, keystream and keystream options come from it.
+    mac_mode is one of MAC_MODES; 'bytes' and 'tree' avoid hashing the
+    8x larger bit string.
+    """
+    if mac_mode not in MAC_MODES:
+        raise ValueError(f"Unknown MAC mode '{mac_mode}'")
+    data = message.encode('utf-8')
+    if prefetcher is not None:
+        if iv is not None:
+            raise ValueError("iv cannot be given together with a prefetcher")
+        if (prefetcher.a, prefetcher.b) != (1.4, 0.3):
+            raise ValueError("encrypt_authenticated needs a prefetcher with default a and b")
+        options = prefetcher.options
+        iv, keystream = _take_pad(prefetcher, key, len(data))
+    else:
+        options = _keystream_options(lanes, extraction, bits_per_value)
+        if iv is None:
+            iv = generate_iv(key)
+        # Generate exactly one keystream byte per encoded message byte
+        keystream = _message_keystream(key ^ iv, len(data), **options)
     
     # Encrypt
-    ciphertext = encrypt(message, keystream)
+    packed = np.frombuffer(encrypt_bytes(data, keystream), dtype=np.uint8)
+    ciphertext = bytes_to_bits(packed)
     
-    # Create HMAC
-    mac = hmac.new(key.to_bytes(32, 'big'), 
-                   ciphertext.encode(), 
-                   hashlib.sha256).hexdigest()
+    # Create MAC
+    mac = _message_mac(key, ciphertext, iv, options, mac_mode, packed)
     
     return {
         'ciphertext': ciphertext,
         'mac': mac,
-        'iv': hex(iv)[2:]  # Remove '0x' prefix
+        'iv': hex(iv)[2:],  # Remove '0x' prefix
+        'length': len(data),
+        **options,
+        'mac_mode': mac_mode
     }
 
-def decrypt_authenticated(encrypted: Dict[str, str], key: int) -> str:
+def decrypt_authenticated(encrypted: Dict[str, Union[str, int]], key: int) -> str:
     """Decrypt with authentication verification."""
-    # Verify HMAC
-    expected_mac = hmac.new(key.to_bytes(32, 'big'),
-                           encrypted['ciphertext'].encode(),
-                           hashlib.sha256).hexdigest()
+    # Verify MAC; outputs predating mac_mode MAC the bit string
+    ciphertext = encrypted['ciphertext']
+    mac_mode = encrypted.get('mac_mode')
+    iv = int(encrypted['iv'], 16)
+    options = _recorded_options(encrypted)
+    packed = None
+    if mac_mode not in (None, 'bits'):
+        if len(ciphertext) % 8:
+            raise ValueError("Invalid binary string")
+        packed = bits_to_bytes(ciphertext)
+    expected_mac = _message_mac(key, ciphertext, iv, options, mac_mode, packed)
     
     if not hmac.compare_digest(expected_mac, encrypted['mac']):
         raise ValueError("Message authentication failed")
     
+    # Older outputs carry no length; it always follows from the ciphertext
+    length = len(encrypted['ciphertext']) // 8
+    if int(encrypted.get('length', length)) != length:
+        raise ValueError("Ciphertext length does not match recorded length")
+    
     # Generate keystream
-    iv = int(encrypted['iv'], 16)
-    from chaotic_generator import generate_stellar_sequence
-    sequence = generate_stellar_sequence(key ^ iv)
-    keystream = chaotic_to_keystream(sequence)
+    keystream = _message_keystream(key ^ iv, length, **options)
     
     # Decrypt
-    return decrypt(encrypted['ciphertext'], keystream)
+    if packed is None:
+        return decrypt(ciphertext, keystream)
+    return decrypt_bytes(packed, keystream).decode('utf-8')
+
+class BatchResult(NamedTuple):
+    """Outcome of one item of a batch call: a value, or the error it raised."""
+    value: Any
+    error: Optional[Exception]
+
+# Most iterates one lockstep pass generates; longer messages get their own
+_BATCH_MAX_ELEMENTS = 1 << 20
+_BATCH_LONG_LENGTH = 1 << 16
+
+def _batch_keystreams(seeds: Sequence[int], lengths: Sequence[int]) -> List[np.ndarray]:
+    """Generate one keystream per seed in lockstep passes.
+
+    Seeds are grouped by length, each pass holding lengths within a factor
+    of two of each other and at most _BATCH_MAX_ELEMENTS iterates, so the
+    padding never more than doubles the work. Messages longer than
+    _BATCH_LONG_LENGTH are generated on their own. A keystream whose
+    orbit diverged is returned as an OverflowError instead.
+    """
+    results: List[Any] = [None] * len(seeds)
+    batched = []
+    for i, (seed, length) in enumerate(zip(seeds, lengths)):
+        if length <= _BATCH_LONG_LENGTH:
+            batched.append(i)
+            continue
+        try:
+            results[i] = _message_keystream(seed, length)
+        except OverflowError as e:
+            results[i] = e
+    
+    batched.sort(key=lambda i: lengths[i])
+    start = 0
+    while start < len(batched):
+        shortest, end = max(lengths[batched[start]], 1), start + 1
+        while (end < len(batched) and lengths[batched[end]] <= 2 * shortest
+               and (end - start + 1) * lengths[batched[end]] <= _BATCH_MAX_ELEMENTS):
+            end += 1
+        group = batched[start:end]
+        conditions = np.array([_initial_conditions(seeds[i]) for i in group])
+        sequences = henon_batch(conditions[:, 0], conditions[:, 1], [lengths[i] for i in group])
+        keystreams = quantize_sequence(sequences).astype(np.uint8)
+        for row, i in enumerate(group):
+            length = lengths[i]
+            if length and not np.isfinite(sequences[row, length - 1]):
+                results[i] = OverflowError("Hénon orbit diverged for this seed")
+            else:
+                results[i] = keystreams[row, :length]
+        start = end
+    return results
+
+def _generate_ivs(key: int, count: int) -> List[int]:
+    """Draw count IVs like generate_iv, warming up all candidates in lockstep."""
+    ivs: List[int] = []
+    while len(ivs) < count:
+        candidates = [secrets.randbits(128)
+                      for _ in range(min(count - len(ivs), _BATCH_MAX_ELEMENTS // 128))]
+        conditions = np.array([_initial_conditions(key ^ iv) for iv in candidates])
+        warmup = henon_batch(conditions[:, 0], conditions[:, 1], np.full(len(candidates), 128))
+        ivs.extend(iv for iv, ok in zip(candidates, np.isfinite(warmup[:, -1])) if ok)
+    return ivs
+
+def _map_in_pool(fn: Callable, items: List, workers: Optional[int]) -> List:
+    """Map fn over items, splitting them into one contiguous slice per worker."""
+    if workers == 1 or len(items) < 2:
+        return [fn(item) for item in items]
+    count = workers or min(32, (os.cpu_count() or 1) + 4)  # ThreadPoolExecutor's default
+    size = (len(items) + count - 1) // count
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        slices = executor.map(lambda start: [fn(item) for item in items[start:start + size]],
+                              range(0, len(items), size))
+        return [result for chunk in slices for result in chunk]
+
+def encrypt_many(messages: Sequence[str], key: int,
+                 ivs: Optional[Sequence[Optional[int]]] = None,
+                 workers: Optional[int] = None) -> List[BatchResult]:
+    """Encrypt many messages under one key, like encrypt_authenticated.
+
+    Keystreams for all messages are generated together in one vectorized
+    pass and MACs are computed in a thread pool. Results come back in input
+    order; an item that fails carries its exception instead of aborting
+    the batch.
+    """
+    if ivs is None:
+        ivs = [None] * len(messages)
+    if len(ivs) != len(messages):
+        raise ValueError("ivs must match messages in length")
+    
+    results: List[Optional[BatchResult]] = [None] * len(messages)
+    pending, data, chosen_ivs = [], [], []
+    for i, (message, iv) in enumerate(zip(messages, ivs)):
+        try:
+            encoded = message.encode('utf-8')
+            if not encoded:
+                raise ValueError("Plaintext cannot be empty")
+            if iv is not None and not 0 <= iv < 2**128:
+                raise ValueError("IV must be a 128-bit non-negative integer")
+        except Exception as e:
+            results[i] = BatchResult(None, e)
+            continue
+        pending.append(i)
+        data.append(encoded)
+        chosen_ivs.append(iv)
+    
+    fresh = iter(_generate_ivs(key, chosen_ivs.count(None)))
+    chosen_ivs = [next(fresh) if iv is None else iv for iv in chosen_ivs]
+    keystreams = _batch_keystreams([key ^ iv for iv in chosen_ivs], [len(d) for d in data])
+    
+    def finish(item):
+        encoded, keystream, iv = item
+        if isinstance(keystream, Exception):
+            return BatchResult(None, keystream)
+        ciphertext = bytes_to_bits(encrypt_bytes(encoded, keystream))
+        return BatchResult({
+            'ciphertext': ciphertext,
+            'mac': _message_mac(key, ciphertext, iv, _LEGACY_OPTIONS),
+            'iv': hex(iv)[2:],
+            'length': len(encoded),
+            **_LEGACY_OPTIONS,
+            'mac_mode': 'bits'
+        }, None)
+    
+    for i, result in zip(pending, _map_in_pool(finish, list(zip(data, keystreams, chosen_ivs)), workers)):
+        results[i] = result
+    return results
+
+def decrypt_many(encrypted: Sequence[Dict[str, Union[str, int]]], key: int,
+                 workers: Optional[int] = None) -> List[BatchResult]:
+    """Verify and decrypt many encrypt_authenticated outputs under one key.
+
+    MACs are verified in a thread pool before any keystream is generated;
+    verified items share one vectorized keystream pass. Results come back
+    in input order with per-item errors.
+    """
+    def verify(item):
+        try:
+            iv, options = int(item['iv'], 16), _recorded_options(item)
+            expected_mac = _message_mac(key, item['ciphertext'], iv, options, item.get('mac_mode'))
+            if not hmac.compare_digest(expected_mac, item['mac']):
+                raise ValueError("Message authentication failed")
+            length = len(item['ciphertext']) // 8
+            if int(item.get('length', length)) != length:
+                raise ValueError("Ciphertext length does not match recorded length")
+            return length, iv, options, None
+        except Exception as e:
+            return None, None, None, e
+    
+    checked = _map_in_pool(verify, list(encrypted), workers)
+    results: List[Optional[BatchResult]] = [None] * len(encrypted)
+    batched = _keystream_options(1, 'fractional', None)
+    pending = [i for i, (_, _, options, error) in enumerate(checked)
+               if error is None and options == batched]
+    for i, (length, iv, options, error) in enumerate(checked):
+        if error is not None:
+            results[i] = BatchResult(None, error)
+        elif options != batched:
+            # Multi-lane and mantissa keystreams are already vectorized per message
+            try:
+                keystream = _message_keystream(key ^ iv, length, **options)
+                results[i] = BatchResult(decrypt(encrypted[i]['ciphertext'], keystream), None)
+            except Exception as e:
+                results[i] = BatchResult(None, e)
+    
+    keystreams = _batch_keystreams([key ^ checked[i][1] for i in pending],
+                                   [checked[i][0] for i in pending])
+    for i, keystream in zip(pending, keystreams):
+        try:
+            if isinstance(keystream, Exception):
+                raise keystream
+            results[i] = BatchResult(decrypt(encrypted[i]['ciphertext'], keystream), None)
+        except Exception as e:
+            results[i] = BatchResult(None, e)
+    return results
+
+def encrypt_authenticated_bytes(message: Union[bytes, bytearray, memoryview], key: int,
+                                iv: Optional[int] = None, a: float = 1.4,
+                                b: float = 0.3, lanes: int = 1, extraction: str = 'fractional',
+                                bits_per_value: Optional[int] = None,
+                                prefetcher: Optional[KeystreamPrefetcher] = None) -> bytes:
+    """Encrypt with authentication into a compact binary envelope.
+
+    The HMAC-SHA256 covers the envelope header and the packed ciphertext.
+    With a prefetcher, the IV, keystream, a, b and keystream options come
+    from it.
+    """
+    if prefetcher is not None:
+        if iv is not None:
+            raise ValueError("iv cannot be given together with a prefetcher")
+        a, b, options = prefetcher.a, prefetcher.b, prefetcher.options
+        iv, keystream = _take_pad(prefetcher, key, len(message))
+    else:
+        options = _keystream_options(lanes, extraction, bits_per_value)
+        if iv is None:
+            iv = generate_iv(key, a, b)
+        keystream = _message_keystream(key ^ iv, len(message), a, b, **options)
+    ciphertext = encrypt_bytes(message, keystream)
+    mac = hmac.new(key.to_bytes(32, 'big'),
+                   envelope.pack_header(iv, len(ciphertext), a, b, **options), hashlib.sha256)
+    mac.update(ciphertext)
+    return envelope.pack(ciphertext, mac.digest(), iv, a, b, **options)
+
+def decrypt_authenticated_bytes(data: Union[bytes, bytearray, memoryview], key: int) -> bytes:
+    """Verify and decrypt an envelope produced by encrypt_authenticated_bytes."""
+    parsed = envelope.unpack(data)
+    expected_mac = hmac.new(key.to_bytes(32, 'big'), parsed.authenticated,
+                            hashlib.sha256).digest()
+    if not hmac.compare_digest(expected_mac, parsed.mac):
+        raise ValueError("Message authentication failed")
+    
+    keystream = _message_keystream(key ^ parsed.iv, len(parsed.ciphertext), parsed.a, parsed.b,
+                                   parsed.lanes, parsed.extraction, parsed.bits_per_value)
+    return decrypt_bytes(parsed.ciphertext, keystream)
+
+DEFAULT_STREAM_CHUNK_SIZE = 1 << 16
+# Largest chunk size a StreamDecryptor accepts from an unauthenticated header
+MAX_STREAM_CHUNK_SIZE = 1 << 24
+# Keystream generation step, independent of the chunk size, so a chunk's
+# keystream never needs more than this many iterates of scratch space
+_STREAM_SCRATCH_SIZE = 1 << 16
+
+def _chunk_mac(header_mac: 'hmac.HMAC', index: int, flags: int,
+               ciphertext: Union[bytes, bytearray, memoryview]) -> bytes:
+    """MAC of one stream chunk, bound to the stream header, its index and flags."""
+    mac = header_mac.copy()
+    mac.update(index.to_bytes(8, 'big') + bytes([flags]))
+    mac.update(ciphertext)
+    return mac.digest()
+
+class StreamEncryptor:
+    """Incrementally encrypt into the chunked encrypt-then-MAC stream format.
+
+    Emit header first, then whatever update() returns for each piece of
+    plaintext, then finalize(). Plaintext is cut into chunk_size chunks,
+    each carrying its own MAC; the last one is flagged final.
+    """
+
+    def __init__(self, key: int, iv: Optional[int] = None, a: float = 1.4, b: float = 0.3,
+                 chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE):
+        # Larger chunks could not be read back by a default StreamDecryptor
+        if not 1 <= chunk_size <= MAX_STREAM_CHUNK_SIZE:
+            raise ValueError(f"chunk_size must be between 1 and {MAX_STREAM_CHUNK_SIZE}")
+        if iv is None:
+            iv = generate_iv(key, a, b)
+        self.chunk_size = chunk_size
+        self.header = envelope.pack_stream_header(iv, chunk_size, a, b)
+        self._header_mac = hmac.new(key.to_bytes(32, 'big'), self.header, hashlib.sha256)
+        self._stream = HenonStream(key ^ iv, a, b, min(chunk_size, _STREAM_SCRATCH_SIZE))
+        self._pending = bytearray()
+        self._index = 0
+        self._finalized = False
+
+    def _record(self, data: Union[bytes, bytearray, memoryview], flags: int) -> bytes:
+        ciphertext = np.bitwise_xor(np.frombuffer(data, dtype=np.uint8),
+                                    self._stream.read(len(data))).tobytes()
+        mac = _chunk_mac(self._header_mac, self._index, flags, ciphertext)
+        self._index += 1
+        return envelope.pack_record(flags, ciphertext, mac)
+
+    def update(self, data: Union[bytes, bytearray, memoryview]) -> bytes:
+        """Records for every chunk completed by data (possibly none)."""
+        if self._finalized:
+            raise ValueError("Stream already finalized")
+        self._pending += data
+        records = []
+        # Hold back a full chunk until more data shows it is not the last
+        while len(self._pending) > self.chunk_size:
+            records.append(self._record(memoryview(self._pending)[:self.chunk_size], 0))
+            del self._pending[:self.chunk_size]
+        return b''.join(records)
+
+    def finalize(self) -> bytes:
+        """The final record, holding any remaining plaintext."""
+        if self._finalized:
+            raise ValueError("Stream already finalized")
+        self._finalized = True
+        record = self._record(bytes(self._pending), envelope.FINAL_CHUNK)
+        self._pending.clear()
+        return record
+
+class StreamDecryptor:
+    """Incrementally verify and decrypt the chunked stream format.
+
+    Feed the stream in pieces of any size to update(), which returns the
+    plaintext of every chunk whose MAC verified. The first bad, reordered
+    or oversized chunk raises ValueError; finalize() raises if the final
+    chunk never arrived. At most one chunk is buffered, and headers
+    declaring chunks larger than max_chunk_size are rejected before any
+    is.
+    """
+
+    def __init__(self, key: int, max_chunk_size: int = MAX_STREAM_CHUNK_SIZE):
+        if max_chunk_size < 1:
+            raise ValueError("max_chunk_size must be positive")
+        self._key = key
+        self.max_chunk_size = max_chunk_size
+        self._buffer = bytearray()
+        self._index = 0
+        self.header: Optional[envelope.StreamHeader] = None
+        self.complete = False
+
+    def _start(self) -> None:
+        header = envelope.unpack_stream_header(self._buffer)
+        # The header is only authenticated with the first chunk, so bound
+        # what it can make us buffer before trusting it
+        if header.chunk_size > self.max_chunk_size:
+            raise ValueError(f"Stream chunk size {header.chunk_size} exceeds "
+                             f"max_chunk_size {self.max_chunk_size}")
+        self.header = header
+        self._header_mac = hmac.new(self._key.to_bytes(32, 'big'),
+                                    self._buffer[:envelope.STREAM_HEADER_SIZE], hashlib.sha256)
+        self._stream = HenonStream(self._key ^ self.header.iv, self.header.a, self.header.b,
+                                   min(self.header.chunk_size, _STREAM_SCRATCH_SIZE))
+        del self._buffer[:envelope.STREAM_HEADER_SIZE]
+
+    def update(self, data: Union[bytes, bytearray, memoryview]) -> List[bytes]:
+        """Plaintext of each chunk completed and verified by data."""
+        self._buffer += data
+        if self.header is None:
+            if len(self._buffer) < envelope.STREAM_HEADER_SIZE:
+                return []
+            self._start()
+        plaintexts = []
+        while not self.complete and len(self._buffer) >= envelope.RECORD_SIZE:
+            flags, length = envelope.unpack_record_prefix(self._buffer)
+            if length > self.header.chunk_size:
+                raise ValueError("Chunk exceeds the stream chunk size")
+            end = envelope.RECORD_SIZE + length + envelope.MAC_SIZE
+            if len(self._buffer) < end:
+                break
+            view = memoryview(self._buffer)
+            ciphertext = view[envelope.RECORD_SIZE:envelope.RECORD_SIZE + length]
+            expected_mac = _chunk_mac(self._header_mac, self._index, flags, ciphertext)
+            if not hmac.compare_digest(expected_mac, view[end - envelope.MAC_SIZE:end]):
+                raise ValueError(f"Message authentication failed for chunk {self._index}")
+            plaintexts.append(np.bitwise_xor(np.frombuffer(ciphertext, dtype=np.uint8),
+                                             self._stream.read(length)).tobytes())
+            del ciphertext, view
+            del self._buffer[:end]
+            self._index += 1
+            self.complete = bool(flags & envelope.FINAL_CHUNK)
+        if self.complete and self._buffer:
+            raise ValueError("Data after the final chunk")
+        return plaintexts
+
+    def finalize(self) -> None:
+        """Check that the stream ended with its final chunk."""
+        if not self.complete:
+            raise ValueError("Stream truncated before the final chunk")
+
+def encrypt_stream_authenticated(chunks: Iterable[Union[bytes, bytearray, memoryview]], key: int,
+                                 iv: Optional[int] = None, a: float = 1.4, b: float = 0.3,
+                                 chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Encrypt an iterable of byte pieces into the chunked stream format, yielding output bytes."""
+    encryptor = StreamEncryptor(key, iv, a, b, chunk_size)
+
+    def records() -> Iterator[bytes]:
+        yield encryptor.header
+        for chunk in chunks:
+            out = encryptor.update(chunk)
+            if out:
+                yield out
+        yield encryptor.finalize()
+    return records()
+
+def decrypt_stream_authenticated(data: Iterable[Union[bytes, bytearray, memoryview]], key: int,
+                                 max_chunk_size: int = MAX_STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Verify and decrypt a chunked stream, yielding plaintext chunk by chunk.
+
+    Raises ValueError at the first chunk that fails; everything yielded
+    before it was authentic, but the message is incomplete.
+    """
+    decryptor = StreamDecryptor(key, max_chunk_size)
+    for piece in data:
+        yield from decryptor.update(piece)
+    decryptor.finalize()
@@ -1,3 +1,4 @@
+import secrets
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from tkinter.scrolledtext import ScrolledText
@@ -9,7 +10,7 @@ from quantum_enhancer import QuantumEnhancer
 from visualizer_3d import Advanced3DVisualizer
 from crypto_analyzer import CryptoAnalyzer
 from neural_analyzer import NeuralAnalyzer
-from key_stretcher import KeyStretcher
+from key_stretcher import KeyStretcher, StretchCache
 from quantum_spacetime_interface import QuantumSpacetimeInterface
 
 class CosmicCipherUI:
@@ -37,7 +38,8 @@ class CosmicCipherUI:
         self.visualizer_3d = Advanced3DVisualizer()
         self.crypto_analyzer = CryptoAnalyzer()
         self.neural_analyzer = NeuralAnalyzer()
-        self.key_stretcher = KeyStretcher()
+        # One salt per session, so re-stretching a key is served from cache
+        self.key_stretcher = KeyStretcher(salt=secrets.token_bytes(32), cache=StretchCache())
         self.quantum_spacetime = QuantumSpacetimeInterface()
 
     def create_menu(self):
@@ -0,0 +1,209 @@
+import hashlib
+import secrets
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Sequence, Tuple
+import quantumrandom as qr
+
+class QuantumSource:
+    """ANU quantum random numbers, fetched as uint16 blocks over the network."""
+
+    name = 'quantum'
+    quantum = True
+
+    def read(self, size: int) -> bytes:
+        values = []
+        remaining = (size + 1) // 2
+        while remaining:
+            count = min(remaining, qr.MAX_LEN)
+            values.extend(qr.get_data('uint16', array_length=count))
+            remaining -= count
+        return b''.join(value.to_bytes(2, 'big') for value in values)[:size]
+
+class SystemSource:
+    """The operating system CSPRNG."""
+
+    name = 'system'
+    quantum = False
+
+    def read(self, size: int) -> bytes:
+        return secrets.token_bytes(size)
+
+class DeterministicSource:
+    """Reproducible SHAKE-256 counter stream for tests and offline use.
+
+    Not a source of entropy: anyone who knows the seed can predict its
+    output. Set quantum to make it stand in for the quantum source.
+    """
+
+    def __init__(self, seed: bytes = b'', name: str = 'deterministic', quantum: bool = False):
+        self.seed = seed
+        self.name = name
+        self.quantum = quantum
+        self._counter = 0
+
+    def read(self, size: int) -> bytes:
+        data = hashlib.shake_256(self._counter.to_bytes(8, 'big') + self.seed).digest(size)
+        self._counter += 1
+        return data
+
+class EntropyPool:
+    """Bounded buffer of random bytes refilled from sources on a background thread.
+
+    Sources are objects with a name, a quantum flag and read(size), tried in
+    order for each batch of batch_size bytes; a source that fails is skipped
+    for retry_interval seconds. The thread tops the buffer up to capacity
+    whenever it drops below low_water, or below what waiting draws need,
+    so draws are served from memory. Drawn bytes are zeroed in the buffer.
+    """
+
+    def __init__(self, sources: Optional[Sequence] = None, capacity: int = 4096,
+                 batch_size: int = 1024, low_water: Optional[int] = None,
+                 retry_interval: float = 30.0):
+        if capacity < 1 or batch_size < 1:
+            raise ValueError("capacity and batch_size must be positive")
+        self.sources = list(sources) if sources is not None else [QuantumSource(), SystemSource()]
+        if not self.sources:
+            raise ValueError("At least one entropy source is required")
+        self.capacity = capacity
+        self.batch_size = min(batch_size, capacity)
+        self.low_water = capacity // 2 if low_water is None else low_water
+        if not 0 < self.low_water <= capacity:
+            raise ValueError("low_water must be between 1 and capacity")
+        self.retry_interval = retry_interval
+        self.buffered = 0
+        self.draws = 0
+        self.waits = 0
+        self._demand = 0  # bytes wanted by draws waiting for a refill
+        self._chunks = deque()
+        self._usage = {source.name: {'bytes': 0, 'batches': 0, 'failures': 0, 'served': 0}
+                       for source in self.sources}
+        self._retry_at = [0.0] * len(self.sources)
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._refill_loop, name='entropy-pool', daemon=True)
+        self._thread.start()
+
+    def take(self, size: int, timeout: Optional[float] = None) -> Tuple[bytes, bool]:
+        """Draw size bytes, and whether all of them came from quantum sources.
+
+        Blocks while the buffer refills; raises TimeoutError after timeout
+        seconds and RuntimeError once the pool is closed.
+        """
+        if not 0 < size <= self.capacity:
+            raise ValueError(f"size must be between 1 and {self.capacity}")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self.buffered < size:
+                self.waits += 1
+                self._demand += size
+                try:
+                    while self.buffered < size:
+                        if self._closed:
+                            raise RuntimeError("Entropy pool is closed")
+                        self._cond.notify_all()
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            raise TimeoutError("Entropy pool did not refill in time")
+                        self._cond.wait(remaining)
+                finally:
+                    self._demand -= size
+
+            parts, quantum = [], True
+            while size:
+                name, is_quantum, chunk = self._chunks[0]
+                count = min(size, len(chunk))
+                parts.append(bytes(chunk[:count]))
+                chunk[:count] = bytes(count)
+                if count == len(chunk):
+                    self._chunks.popleft()
+                else:
+                    del chunk[:count]
+                self._usage[name]['served'] += count
+                quantum = quantum and is_quantum
+                self.buffered -= count
+                size -= count
+            self.draws += 1
+            if self.buffered < self.low_water:
+                self._cond.notify_all()
+        return b''.join(parts), quantum
+
+    def stats(self) -> Dict[str, object]:
+        """Buffer occupancy, draw counters and per-source usage."""
+        with self._cond:
+            return {
+                'buffered': self.buffered,
+                'capacity': self.capacity,
+                'draws': self.draws,
+                'waits': self.waits,
+                'sources': {name: dict(usage) for name, usage in self._usage.items()}
+            }
+
+    def close(self) -> None:
+        """Stop the refill thread and zero the buffer."""
+        with self._cond:
+            self._closed = True
+            for _, _, chunk in self._chunks:
+                chunk[:] = bytes(len(chunk))
+            self._chunks.clear()
+            self.buffered = 0
+            self._cond.notify_all()
+        # A source blocked on the network finishes in the background; the
+        # thread discards its batch once it sees the pool closed
+        self._thread.join(timeout=1.0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _refill_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed and not self._needs_refill():
+                    self._cond.wait()
+            # Top up to capacity in batches, then sleep until below low_water
+            while True:
+                with self._cond:
+                    if self._closed:
+                        return
+                    size = min(self.batch_size, self.capacity - self.buffered)
+                if not size:
+                    break
+                # Sources may block on the network, so fetch without the lock
+                batch = self._fetch(size)
+                with self._cond:
+                    if self._closed:
+                        return
+                    if batch is None:
+                        # Every source is failing or backing off
+                        self._cond.wait(min(self.retry_interval, 1.0))
+                        continue
+                    self._chunks.append(batch)
+                    self.buffered += len(batch[2])
+                    self._cond.notify_all()
+
+    def _needs_refill(self) -> bool:
+        return self.buffered < self.capacity and (self.buffered < self.low_water
+                                                  or self.buffered < self._demand)
+
+    def _fetch(self, size: int):
+        now = time.monotonic()
+        for index, source in enumerate(self.sources):
+            if self._retry_at[index] > now:
+                continue
+            usage = self._usage[source.name]
+            try:
+                data = bytearray(source.read(size))
+                if len(data) != size:
+                    raise ValueError(f"Source returned {len(data)} of {size} bytes")
+            except Exception:
+                usage['failures'] += 1
+                self._retry_at[index] = now + self.retry_interval
+                continue
+            usage['bytes'] += size
+            usage['batches'] += 1
+            return source.name, source.quantum, data
+        return None
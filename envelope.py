@@ -0,0 +1,138 @@
+import struct
+from typing import NamedTuple, Tuple, Union
+from chaotic_generator import EXTRACTION_MODES
+
+# Version 1: magic, version, a, b, iv, ciphertext length
+# Version 2 appends the number of interleaved keystream lanes
+# Version 3 appends the extraction mode code and bits per iterate
+_HEADER_FORMATS = {1: '>4sBdd16sQ', 2: '>4sBdd16sQB', 3: '>4sBdd16sQBBB'}
+MAGIC = b'CSCE'
+VERSION = 3
+HEADER_SIZE = struct.calcsize(_HEADER_FORMATS[VERSION])
+MAC_SIZE = 32
+
+class Header(NamedTuple):
+    """Parsed envelope header; size is its length in bytes for this version."""
+    version: int
+    a: float
+    b: float
+    iv: int
+    length: int
+    lanes: int
+    extraction: str
+    bits_per_value: int
+    size: int
+
+class Envelope(NamedTuple):
+    """Parsed envelope; the buffer fields are memoryviews into the packed data."""
+    version: int
+    a: float
+    b: float
+    iv: int
+    lanes: int
+    extraction: str
+    bits_per_value: int
+    ciphertext: memoryview
+    mac: memoryview
+    authenticated: memoryview  # header and ciphertext, the bytes covered by mac
+
+def pack_header(iv: int, length: int, a: float = 1.4, b: float = 0.3, lanes: int = 1,
+                extraction: str = 'fractional', bits_per_value: int = 8) -> bytes:
+    """Fixed-size header preceding the ciphertext."""
+    if extraction not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode '{extraction}'")
+    if not 1 <= lanes <= 255:
+        raise ValueError("lanes must be between 1 and 255")
+    return struct.pack(_HEADER_FORMATS[VERSION], MAGIC, VERSION, a, b, iv.to_bytes(16, 'big'),
+                       length, lanes, EXTRACTION_MODES.index(extraction), bits_per_value)
+
+def pack(ciphertext: Union[bytes, bytearray, memoryview], mac: bytes, iv: int,
+         a: float = 1.4, b: float = 0.3, lanes: int = 1,
+         extraction: str = 'fractional', bits_per_value: int = 8) -> bytes:
+    """Assemble header, ciphertext and MAC into one envelope."""
+    if len(mac) != MAC_SIZE:
+        raise ValueError(f"MAC must be {MAC_SIZE} bytes")
+    header = pack_header(iv, len(ciphertext), a, b, lanes, extraction, bits_per_value)
+    return b''.join((header, ciphertext, mac))
+
+def unpack_header(data: Union[bytes, bytearray, memoryview]) -> Header:
+    """Parse and validate a header of any supported version."""
+    if len(data) < 5 or bytes(data[:4]) != MAGIC:
+        raise ValueError("Not a Cosmic Cipher envelope")
+    version = data[4]
+    if version not in _HEADER_FORMATS:
+        raise ValueError(f"Unsupported envelope version {version}")
+    header_format = _HEADER_FORMATS[version]
+    size = struct.calcsize(header_format)
+    if len(data) < size:
+        raise ValueError("Envelope is too short")
+    fields = struct.unpack_from(header_format, data)
+    _, _, a, b, iv, length = fields[:6]
+    lanes = fields[6] if version >= 2 else 1
+    mode, bits_per_value = fields[7:9] if version >= 3 else (0, 8)
+    if lanes < 1:
+        raise ValueError("Envelope lane count must be at least 1")
+    if mode >= len(EXTRACTION_MODES):
+        raise ValueError(f"Unknown extraction mode code {mode}")
+    return Header(version, a, b, int.from_bytes(iv, 'big'), length, lanes,
+                  EXTRACTION_MODES[mode], bits_per_value, size)
+
+def unpack(data: Union[bytes, bytearray, memoryview]) -> Envelope:
+    """Parse an envelope without copying the ciphertext or MAC."""
+    view = memoryview(data).cast('B')
+    header = unpack_header(view)
+    end = header.size + header.length
+    if len(view) != end + MAC_SIZE:
+        raise ValueError("Envelope length does not match header")
+    return Envelope(header.version, header.a, header.b, header.iv, header.lanes,
+                    header.extraction, header.bits_per_value,
+                    view[header.size:end], view[end:], view[:end])
+
+# Chunked streams: a header, then one record per chunk of flags, length,
+# ciphertext and a MAC over the header, chunk index, flags and ciphertext
+STREAM_MAGIC = b'CSCS'
+STREAM_VERSION = 1
+STREAM_HEADER_FORMAT = '>4sBdd16sI'
+STREAM_HEADER_SIZE = struct.calcsize(STREAM_HEADER_FORMAT)
+RECORD_FORMAT = '>BI'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+FINAL_CHUNK = 0x01
+
+class StreamHeader(NamedTuple):
+    """Parsed chunked-stream header."""
+    version: int
+    a: float
+    b: float
+    iv: int
+    chunk_size: int
+
+def pack_stream_header(iv: int, chunk_size: int, a: float = 1.4, b: float = 0.3) -> bytes:
+    """Header opening a chunked stream."""
+    return struct.pack(STREAM_HEADER_FORMAT, STREAM_MAGIC, STREAM_VERSION, a, b,
+                       iv.to_bytes(16, 'big'), chunk_size)
+
+def unpack_stream_header(data: Union[bytes, bytearray, memoryview]) -> StreamHeader:
+    """Parse and validate a chunked-stream header."""
+    if len(data) < STREAM_HEADER_SIZE:
+        raise ValueError("Stream header is too short")
+    magic, version, a, b, iv, chunk_size = struct.unpack_from(STREAM_HEADER_FORMAT, data)
+    if magic != STREAM_MAGIC:
+        raise ValueError("Not a Cosmic Cipher stream")
+    if version != STREAM_VERSION:
+        raise ValueError(f"Unsupported stream version {version}")
+    if chunk_size < 1:
+        raise ValueError("Stream chunk size must be positive")
+    return StreamHeader(version, a, b, int.from_bytes(iv, 'big'), chunk_size)
+
+def pack_record(flags: int, ciphertext: Union[bytes, bytearray, memoryview], mac: bytes) -> bytes:
+    """One chunk record."""
+    if len(mac) != MAC_SIZE:
+        raise ValueError(f"MAC must be {MAC_SIZE} bytes")
+    return b''.join((struct.pack(RECORD_FORMAT, flags, len(ciphertext)), ciphertext, mac))
+
+def unpack_record_prefix(data: Union[bytes, bytearray, memoryview]) -> Tuple[int, int]:
+    """Flags and ciphertext length at the start of a record."""
+    flags, length = struct.unpack_from(RECORD_FORMAT, data)
+    if flags & ~FINAL_CHUNK:
+        raise ValueError(f"Unknown chunk flags {flags:#x}")
+    return flags, length
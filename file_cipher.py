@@ -0,0 +1,181 @@
+import argparse
+import hashlib
+import hmac
+import mmap
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Iterator
+import numpy as np
+from chaotic_generator import HenonStream
+from cosmic_cipher import generate_cosmic_seed, generate_iv
+from envelope import HEADER_SIZE, MAC_SIZE, pack_header, unpack_header
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, if the platform reports it."""
+    if not RESOURCE_AVAILABLE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _stats(size: int, started: float) -> Dict[str, float]:
+    elapsed = time.perf_counter() - started
+    return {
+        'bytes': size,
+        'seconds': elapsed,
+        'mb_per_s': size / (1024 * 1024) / elapsed if elapsed > 0 else float('inf'),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+@contextmanager
+def _mapped(fileobj, access: int = mmap.ACCESS_WRITE) -> Iterator[np.ndarray]:
+    """Memory-map a whole file and expose it as a uint8 array."""
+    mapped = mmap.mmap(fileobj.fileno(), 0, access=access)
+    try:
+        yield np.frombuffer(mapped, dtype=np.uint8)
+    finally:
+        try:
+            mapped.close()
+        except BufferError:
+            # A propagating exception still references a view; the map
+            # is released once that traceback is garbage collected
+            pass
+
+@contextmanager
+def _replacing(path: str) -> Iterator:
+    """Open a temporary file beside path that replaces it only on success.
+
+    Reading and writing the same path is safe, and a failed run leaves
+    neither partial output nor a truncated destination behind.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                    prefix='.' + os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, 'w+b') as tmp:
+            yield tmp
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _xor_mapped(src: np.ndarray, dst: np.ndarray, stream: HenonStream, chunk_size: int,
+                mac: Optional[hmac.HMAC] = None) -> None:
+    """XOR src into dst chunk by chunk, optionally feeding the written bytes to mac."""
+    for offset in range(0, len(src), chunk_size):
+        end = min(offset + chunk_size, len(src))
+        np.bitwise_xor(src[offset:end], stream.read(end - offset), out=dst[offset:end])
+        if mac is not None:
+            mac.update(dst[offset:end])
+
+def encrypt_file(src_path: str, dst_path: str, key: int, iv: Optional[int] = None,
+                 a: float = 1.4, b: float = 0.3,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, float]:
+    """Encrypt a file through memory maps into the envelope format.
+
+    The output can also be read by decrypt_authenticated_bytes. Returns
+    throughput statistics for the run.
+    """
+    started = time.perf_counter()
+    if iv is None:
+        iv = generate_iv(key, a, b)
+    size = os.path.getsize(src_path)
+    header = pack_header(iv, size, a, b)
+    stream = HenonStream(key ^ iv, a, b, chunk_size)
+    mac = hmac.new(key.to_bytes(32, 'big'), header, hashlib.sha256)
+
+    with _replacing(dst_path) as dst, open(src_path, 'rb') as src:
+        dst.truncate(HEADER_SIZE + size + MAC_SIZE)
+        with _mapped(dst) as out:
+            out[:HEADER_SIZE] = np.frombuffer(header, dtype=np.uint8)
+            if size:
+                with _mapped(src, mmap.ACCESS_READ) as data:
+                    _xor_mapped(data, out[HEADER_SIZE:HEADER_SIZE + size], stream, chunk_size, mac)
+                    del data
+            out[HEADER_SIZE + size:] = np.frombuffer(mac.digest(), dtype=np.uint8)
+            del out
+    return _stats(size, started)
+
+def decrypt_file(src_path: str, dst_path: str, key: int,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, float]:
+    """Verify and decrypt a file written by encrypt_file.
+
+    The MAC is checked in a first pass, so no plaintext is written for a
+    tampered file.
+    """
+    started = time.perf_counter()
+    with open(src_path, 'rb') as src:
+        if os.fstat(src.fileno()).st_size < MAC_SIZE + 5:
+            raise ValueError("File is too short to be a Cosmic Cipher file")
+        with _mapped(src, mmap.ACCESS_READ) as data:
+            header = unpack_header(data)
+            size, end = header.length, header.size + header.length
+            if len(data) != end + MAC_SIZE:
+                raise ValueError("File length does not match header")
+            if (header.lanes, header.extraction, header.bits_per_value) != (1, 'fractional', 8):
+                raise ValueError("Only single-lane fractional envelopes can be decrypted as files")
+
+            mac = hmac.new(key.to_bytes(32, 'big'), data[:header.size], hashlib.sha256)
+            ciphertext = data[header.size:end]
+            for offset in range(0, size, chunk_size):
+                mac.update(ciphertext[offset:offset + chunk_size])
+            if not hmac.compare_digest(mac.digest(), data[end:].tobytes()):
+                raise ValueError("Message authentication failed")
+
+            stream = HenonStream(key ^ header.iv, header.a, header.b, chunk_size)
+            with _replacing(dst_path) as dst:
+                dst.truncate(size)
+                if size:
+                    with _mapped(dst) as out:
+                        _xor_mapped(ciphertext, out, stream, chunk_size)
+                        del out
+            del data, ciphertext
+    return _stats(size, started)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Encrypt or decrypt files with the Cosmic Cipher")
+    parser.add_argument('mode', choices=['encrypt', 'decrypt'])
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--key', help="hexadecimal key (generated for encrypt if omitted)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="bytes of keystream generated per step")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.key:
+            key = int(args.key, 16)
+        elif args.mode == 'encrypt':
+            key, quantum_used = generate_cosmic_seed(bytes=32)
+            print(f"Generated {'quantum' if quantum_used else 'PRNG'} key (hex): {key:064x}")
+        else:
+            parser.error("--key is required for decrypt")
+
+        if args.mode == 'encrypt':
+            stats = encrypt_file(args.input, args.output, key, chunk_size=args.chunk_size)
+        else:
+            stats = decrypt_file(args.input, args.output, key, chunk_size=args.chunk_size)
+    except (OSError, ValueError, OverflowError) as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+
+    rss = stats['peak_rss_mb']
+    print(f"{args.mode.capitalize()}ed {stats['bytes']} bytes in {stats['seconds']:.3f}s "
+          f"({stats['mb_per_s']:.1f} MB/s)" + (f", peak RSS {rss:.1f} MB" if rss is not None else ""))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,33 +1,304 @@
+import base64
 import hashlib
 import hmac
-from concurrent.futures import ThreadPoolExecutor
-import numpy as np
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Dict, NamedTuple, Optional, Union
+
+# Each lane chains pbkdf2_hmac calls of this many iterations; progress is
+# reported between calls, so the result does not depend on the callback
+CHUNK_ITERATIONS = 1000
+PROGRESS_STEPS = 100
+KEY_SIZE = 64
+RECORD_SCHEME = 'cosmic-stretch'
+
+def _lane_salt(salt: bytes, lane: int) -> bytes:
+    return salt + lane.to_bytes(4, 'big')
+
+def _start_lane(password: bytes, salt: bytes, memory_cost: Optional[int], block_size: int) -> bytes:
+    """Initial lane state: the password, or its scrypt digest when memory-hard."""
+    if memory_cost is None:
+        return password
+    return hashlib.scrypt(password, salt=salt, n=memory_cost, r=block_size, p=1,
+                          maxmem=256 * block_size * memory_cost + (1 << 20), dklen=KEY_SIZE)
+
+def _advance_lane(state: bytes, salt: bytes, iterations: int) -> bytes:
+    """Run iterations of the lane's PBKDF2-HMAC-SHA3-512 chain."""
+    while iterations > 0:
+        step = min(iterations, CHUNK_ITERATIONS)
+        state = hashlib.pbkdf2_hmac('sha3_512', state, salt, step, KEY_SIZE)
+        iterations -= step
+    return state
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + '=' * (-len(text) % 4), validate=True)
+
+class StretchedKey(NamedTuple):
+    """A derived key with the salt and parameters needed to reproduce it."""
+    key: bytes
+    salt: bytes
+    iterations: int
+    lanes: int
+    memory_cost: Optional[int]
+    block_size: int
+
+    def to_record(self) -> str:
+        """Encode as '$cosmic-stretch$i=..,l=..,m=..,r=..$salt$key' (unpadded base64)."""
+        parameters = f"i={self.iterations},l={self.lanes},m={self.memory_cost or 0},r={self.block_size}"
+        return f"${RECORD_SCHEME}${parameters}${_b64(self.salt)}${_b64(self.key)}"
+
+    @classmethod
+    def from_record(cls, record: str) -> 'StretchedKey':
+        """Parse a to_record() string."""
+        try:
+            empty, scheme, parameters, salt, key = record.split('$')
+            values = dict(item.split('=', 1) for item in parameters.split(','))
+            fields = [int(values[name]) for name in ('i', 'l', 'm', 'r')]
+            salt, key = _unb64(salt), _unb64(key)
+        except (ValueError, KeyError) as e:
+            raise ValueError(f"Malformed stretched key record: {e}") from None
+        if empty or scheme != RECORD_SCHEME:
+            raise ValueError("Not a stretched key record")
+        iterations, lanes, memory_cost, block_size = fields
+        return cls(key, salt, iterations, lanes, memory_cost or None, block_size)
+
+class StretchCache:
+    """LRU cache of stretched keys with a time-to-live.
+
+    Entries are looked up by a keyed BLAKE2b digest of (key, salt,
+    parameters) under a random per-cache secret, so neither keys nor a
+    fast unkeyed hash of them are held. Expired and evicted keys are
+    zeroed.
+    """
+
+    def __init__(self, max_entries: int = 128, ttl: Optional[float] = 300.0):
+        if max_entries < 1:
+            raise ValueError("max_entries must be positive")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._secret = secrets.token_bytes(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup_key(self, password: bytes, salt: bytes, parameters: tuple) -> bytes:
+        """Cache key for one stretch; parameters identify the stretching cost."""
+        digest = hashlib.blake2b(key=self._secret, digest_size=32)
+        for part in (password, salt, repr(parameters).encode()):
+            digest.update(len(part).to_bytes(8, 'big') + part)
+        return digest.digest()
+
+    def get(self, lookup: bytes) -> Optional[bytes]:
+        """The cached stretched key, or None if absent or expired."""
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(lookup)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(lookup)
+            self.hits += 1
+            return bytes(entry[0])
+
+    def put(self, lookup: bytes, key: bytes) -> None:
+        """Store key, evicting the least recently used entries beyond max_entries."""
+        with self._lock:
+            self._expire()
+            if lookup in self._entries:
+                self._discard(lookup)
+            self._entries[lookup] = (bytearray(key), time.monotonic())
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Zero and drop every cached key."""
+        with self._lock:
+            for lookup in list(self._entries):
+                self._discard(lookup)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current occupancy."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries
+            }
+
+    def _expire(self) -> None:
+        if self.ttl is None:
+            return
+        deadline = time.monotonic() - self.ttl
+        # Entries are in insertion order only until a hit moves one, so scan all
+        for lookup in [k for k, (_, stored) in self._entries.items() if stored < deadline]:
+            self._discard(lookup)
+            self.expirations += 1
+
+    def _discard(self, lookup: bytes) -> None:
+        key, _ = self._entries.pop(lookup)
+        key[:] = bytes(len(key))
 
 class KeyStretcher:
-    def __init__(self, iterations=100000):
+    """Derive a stretched key from chained PBKDF2-HMAC-SHA3-512 lanes.
+
+    Each of lanes independent chains runs iterations HMAC iterations under
+    its own salt (in parallel processes when lanes > 1) and the lane
+    outputs are hashed together. With memory_cost, each lane first passes
+    the key through scrypt with N = memory_cost, using about
+    128 * block_size * memory_cost bytes per lane.
+
+    A stored salt is used whenever a call does not pass one; without
+    either, each stretch draws a fresh salt. Stretches with a given or
+    stored salt are served from cache when one is supplied.
+    """
+
+    def __init__(self, iterations: int = 100000, lanes: int = 1,
+                 memory_cost: Optional[int] = None, block_size: int = 8,
+                 executor: Optional[Executor] = None, salt: Optional[bytes] = None,
+                 cache: Optional[StretchCache] = None):
+        if iterations < 1 or lanes < 1 or block_size < 1:
+            raise ValueError("iterations, lanes and block_size must be positive")
+        if memory_cost is not None and (memory_cost < 2 or memory_cost & (memory_cost - 1)):
+            raise ValueError("memory_cost must be a power of two greater than 1")
         self.iterations = iterations
+        self.lanes = lanes
+        self.memory_cost = memory_cost
+        self.block_size = block_size
+        self.executor = executor
+        self.salt = salt
+        self.cache = cache
         self.salt_size = 32
         
-    def stretch_key(self, key_hex, progress_callback=None):
-        """Stretch key using PBKDF2-like algorithm with quantum entropy"""
-        salt = self._generate_salt()
-        stretched = key_hex.encode()
-        
-        with ThreadPoolExecutor() as executor:
-            for i in range(self.iterations):
-                stretched = executor.submit(self._single_stretch, stretched, salt).result()
-                if progress_callback and i % 1000 == 0:
-                    progress_callback(i / self.iterations * 100)
-                    
-        return stretched.hex()
-        
-    def _single_stretch(self, key, salt):
-        """Single iteration of key stretching"""
-        return hmac.new(key, salt, hashlib.sha3_512).digest()
+    @classmethod
+    def calibrate(cls, target_seconds: float = 0.5, lanes: Optional[int] = 1,
+                  memory_cost: Optional[int] = None, block_size: int = 8,
+                  executor: Optional[Executor] = None) -> 'KeyStretcher':
+        """Pick iterations so one stretch takes about target_seconds on this machine.
+
+        lanes=None uses one lane per CPU. A short benchmark of the chain
+        gives a first estimate, then one full trial stretch corrects for
+        fixed costs such as process start-up; expect calibration to take
+        roughly twice target_seconds.
+        """
+        if target_seconds <= 0:
+            raise ValueError("target_seconds must be positive")
+        lanes = lanes or os.cpu_count() or 1
+        salt = bytes(32)
+
+        sample = CHUNK_ITERATIONS
+        while True:
+            started = time.perf_counter()
+            _advance_lane(bytes(KEY_SIZE), salt, sample)
+            elapsed = time.perf_counter() - started
+            if elapsed >= 0.02 or sample >= 1 << 24:
+                break
+            sample *= 4
+        # Lanes beyond the CPU count run in successive rounds
+        rounds = -(-lanes // min(lanes, os.cpu_count() or 1))
+        per_iteration = elapsed / sample * rounds
+        fixed = 0.0
+        if memory_cost is not None:
+            started = time.perf_counter()
+            _start_lane(b'', salt, memory_cost, block_size)
+            fixed = (time.perf_counter() - started) * rounds
+
+        def iterations_for(fixed_seconds: float) -> int:
+            chunks = round((target_seconds - fixed_seconds) / per_iteration / CHUNK_ITERATIONS)
+            return max(1, chunks) * CHUNK_ITERATIONS
+
+        stretcher = cls(iterations_for(fixed), lanes, memory_cost, block_size, executor)
+        started = time.perf_counter()
+        stretcher._derive(b'', salt)
+        actual = time.perf_counter() - started
+        stretcher.iterations = iterations_for(max(0.0, actual - stretcher.iterations * per_iteration))
+        return stretcher
+
+    @classmethod
+    def from_stretched(cls, stretched: StretchedKey, executor: Optional[Executor] = None,
+                       cache: Optional[StretchCache] = None) -> 'KeyStretcher':
+        """A stretcher with the parameters and salt recorded in stretched."""
+        return cls(stretched.iterations, stretched.lanes, stretched.memory_cost,
+                   stretched.block_size, executor, stretched.salt, cache)
+
+    def derive(self, key_hex: str, progress_callback: Optional[Callable[[float], None]] = None,
+               salt: Optional[bytes] = None) -> StretchedKey:
+        """Stretch key, keeping the salt and parameters for verification."""
+        salt = salt if salt is not None else self.salt
+        password = key_hex.encode()
+        if salt is None:
+            # A fresh salt can never hit the cache
+            salt = self._generate_salt()
+            key = self._derive(password, salt, progress_callback)
+        elif self.cache is None:
+            key = self._derive(password, salt, progress_callback)
+        else:
+            lookup = self.cache.lookup_key(password, salt, (self.iterations, self.lanes,
+                                                            self.memory_cost, self.block_size))
+            key = self.cache.get(lookup)
+            if key is None:
+                key = self._derive(password, salt, progress_callback)
+                self.cache.put(lookup, key)
+            elif progress_callback:
+                progress_callback(100.0)
+        return StretchedKey(key, salt, self.iterations, self.lanes, self.memory_cost, self.block_size)
+
+    def stretch_key(self, key_hex: str, progress_callback: Optional[Callable[[float], None]] = None,
+                    salt: Optional[bytes] = None) -> str:
+        """Stretch key, reporting percent complete to progress_callback."""
+        return self.derive(key_hex, progress_callback, salt).key.hex()
+
+    @classmethod
+    def verify(cls, key_hex: str, stretched: Union[str, StretchedKey],
+               executor: Optional[Executor] = None, cache: Optional[StretchCache] = None) -> bool:
+        """Check key_hex against a StretchedKey or its record, using the recorded parameters."""
+        if isinstance(stretched, str):
+            stretched = StretchedKey.from_record(stretched)
+        key = cls.from_stretched(stretched, executor, cache).derive(key_hex).key
+        return hmac.compare_digest(key, stretched.key)
+
+    def _derive(self, password: bytes, salt: bytes,
+                progress_callback: Optional[Callable[[float], None]] = None) -> bytes:
+        salts = [_lane_salt(salt, lane) for lane in range(self.lanes)]
+        # Progress steps are whole chunks, so chunk boundaries never move
+        chunks = -(-self.iterations // CHUNK_ITERATIONS)
+        step = -(-chunks // PROGRESS_STEPS) * CHUNK_ITERATIONS
+
+        pool = None
+        if self.lanes > 1:
+            pool = self.executor or ProcessPoolExecutor(max_workers=min(self.lanes, os.cpu_count() or 1))
+        lane_map = map if pool is None else pool.map
+        try:
+            states = list(lane_map(_start_lane, [password] * self.lanes, salts,
+                                   [self.memory_cost] * self.lanes, [self.block_size] * self.lanes))
+            done = 0
+            while done < self.iterations:
+                count = min(step, self.iterations - done)
+                states = list(lane_map(_advance_lane, states, salts, [count] * self.lanes))
+                done += count
+                if progress_callback:
+                    progress_callback(done / self.iterations * 100)
+        finally:
+            if pool is not None and self.executor is None:
+                pool.shutdown()
+
+        return hashlib.sha3_512(salt + b''.join(states)).digest()
         
-    def _generate_salt(self):
+    def _generate_salt(self) -> bytes:
         """Generate cryptographic salt"""
-        try:
-            return np.random.bytes(self.salt_size)
-        except:
-            return hashlib.sha256(str(np.random.random()).encode()).digest()
+        return secrets.token_bytes(self.salt_size)
@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+import numpy as np
+
+class KeystreamCache:
+    """Byte-budgeted LRU cache of generated keystreams.
+
+    Entries are keyed on (seed, a, b, bits_per_value, lanes, extraction) and hold the longest
+    keystream generated for that key, so shorter requests are served from
+    its prefix. Callers always receive a copy; evicted buffers are zeroed.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be positive")
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, seed: int, length: int, a: float = 1.4, b: float = 0.3,
+            bits_per_value: int = 8, lanes: int = 1,
+            extraction: str = 'fractional') -> Optional[np.ndarray]:
+        """Return a copy of the first length keystream bytes, or None on a miss."""
+        key = (seed, a, b, bits_per_value, lanes, extraction)
+        with self._lock:
+            keystream = self._entries.get(key)
+            if keystream is None or len(keystream) < length:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return keystream[:length].copy()
+
+    def put(self, seed: int, keystream: np.ndarray, a: float = 1.4, b: float = 0.3,
+            bits_per_value: int = 8, lanes: int = 1, extraction: str = 'fractional') -> None:
+        """Store a keystream unless a longer one is already cached for the key."""
+        if keystream.nbytes > self.max_bytes:
+            return
+        key = (seed, a, b, bits_per_value, lanes, extraction)
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                if len(existing) >= len(keystream):
+                    return
+                self._discard(key)
+            self._entries[key] = np.array(keystream, dtype=np.uint8)
+            self.current_bytes += keystream.nbytes
+            while self.current_bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Zero and drop every cached keystream."""
+        with self._lock:
+            for key in list(self._entries):
+                self._discard(key)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current occupancy."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def _discard(self, key) -> None:
+        keystream = self._entries.pop(key)
+        self.current_bytes -= keystream.nbytes
+        keystream.fill(0)
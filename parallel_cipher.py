@@ -0,0 +1,95 @@
+import hashlib
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import count
+from multiprocessing import shared_memory
+from typing import Optional, Union
+import numpy as np
+from chaotic_generator import HenonStream
+
+DEFAULT_SEGMENT_SIZE = 1 << 20
+
+def segment_seed(seed: int, index: int, attempt: int = 0) -> int:
+    """Derive the Hénon seed of one segment from the stream seed (key ^ iv)."""
+    material = (seed.to_bytes((seed.bit_length() + 7) // 8, 'big')
+                + index.to_bytes(8, 'big') + attempt.to_bytes(4, 'big'))
+    return int.from_bytes(hashlib.sha256(material).digest(), 'big')
+
+def segment_keystream(seed: int, index: int, size: int,
+                      a: float = 1.4, b: float = 0.3) -> np.ndarray:
+    """Keystream of one segment.
+
+    Segment seeds whose orbit diverges are re-derived with the next attempt
+    counter, so encryption and decryption skip the same seeds.
+    """
+    for attempt in count():
+        try:
+            return HenonStream(segment_seed(seed, index, attempt), a, b).read(size)
+        except OverflowError:
+            continue
+
+def _xor_segment(src_name: str, dst_name: str, total: int, seed: int, index: int,
+                 segment_size: int, a: float, b: float) -> None:
+    """Worker: XOR one segment of the shared input into the shared output."""
+    src = shared_memory.SharedMemory(name=src_name)
+    dst = shared_memory.SharedMemory(name=dst_name)
+    try:
+        start = index * segment_size
+        end = min(start + segment_size, total)
+        data = np.frombuffer(src.buf, dtype=np.uint8, count=end - start, offset=start)
+        out = np.frombuffer(dst.buf, dtype=np.uint8, count=end - start, offset=start)
+        np.bitwise_xor(data, segment_keystream(seed, index, end - start, a, b), out=out)
+        del data, out
+    finally:
+        src.close()
+        dst.close()
+
+def encrypt_segmented(data: Union[bytes, bytearray, memoryview], key: int, iv: int,
+                      segment_size: int = DEFAULT_SEGMENT_SIZE, workers: Optional[int] = None,
+                      a: float = 1.4, b: float = 0.3,
+                      executor: Optional[Executor] = None) -> bytes:
+    """Encrypt data in independent segments spread across processes.
+
+    Each segment draws its keystream from its own seed derived from key ^ iv
+    and the segment index, counter-mode style, so segments can be processed
+    in any order. Workers write straight into a shared output buffer.
+    """
+    if not len(data):
+        raise ValueError("Plaintext cannot be empty")
+    if segment_size < 1:
+        raise ValueError("segment_size must be positive")
+
+    seed = key ^ iv
+    total = len(data)
+    segments = (total + segment_size - 1) // segment_size
+    if segments == 1 and executor is None:
+        plain = np.frombuffer(data, dtype=np.uint8)
+        return np.bitwise_xor(plain, segment_keystream(seed, 0, total, a, b)).tobytes()
+
+    src = shared_memory.SharedMemory(create=True, size=total)
+    dst = shared_memory.SharedMemory(create=True, size=total)
+    try:
+        src.buf[:total] = memoryview(data).cast('B')
+        pool = executor or ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = [pool.submit(_xor_segment, src.name, dst.name, total, seed,
+                                   index, segment_size, a, b)
+                       for index in range(segments)]
+            for future in futures:
+                future.result()
+        finally:
+            if executor is None:
+                pool.shutdown()
+        return bytes(dst.buf[:total])
+    finally:
+        for shm in (src, dst):
+            shm.close()
+            shm.unlink()
+
+def decrypt_segmented(data: Union[bytes, bytearray, memoryview], key: int, iv: int,
+                      segment_size: int = DEFAULT_SEGMENT_SIZE, workers: Optional[int] = None,
+                      a: float = 1.4, b: float = 0.3,
+                      executor: Optional[Executor] = None) -> bytes:
+    """Decrypt data produced by encrypt_segmented with the same segment_size."""
+    if not len(data):
+        raise ValueError("Ciphertext cannot be empty")
+    return encrypt_segmented(data, key, iv, segment_size, workers, a, b, executor)
@@ -1,12 +1,46 @@
+import asyncio
+import hashlib
+import hmac
+import mmap
+import os
+import tempfile
+import threading
+import time
 import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from cosmic_cipher import generate_cosmic_seed, chaotic_to_keystream, encrypt, decrypt, encrypt_authenticated, decrypt_authenticated
+from cosmic_cipher import chaotic_to_keystream_bytes, encrypt_bytes, decrypt_bytes, encrypt_stream, decrypt_stream
+from cosmic_cipher import decrypt_range, generate_iv, KeystreamPrefetcher, encrypt_into, decrypt_into
+from cosmic_cipher import StreamEncryptor, StreamDecryptor, encrypt_stream_authenticated, decrypt_stream_authenticated
+from file_cipher import encrypt_file, decrypt_file, HEADER_SIZE
+from parallel_cipher import encrypt_segmented, decrypt_segmented, segment_keystream
+from keystream_cache import KeystreamCache
+import cosmic_cipher
+import binary_utils
+import aio
+from cipher_daemon import CipherDaemon, CipherClient
+from key_stretcher import KeyStretcher, StretchCache, StretchedKey, CHUNK_ITERATIONS
+from entropy_pool import EntropyPool, DeterministicSource
+from binary_utils import bits_to_bytes
+from tree_mac import tree_mac
+import envelope
+from cosmic_cipher import encrypt_authenticated_bytes, decrypt_authenticated_bytes, encrypt_many, decrypt_many
 from chaotic_generator import generate_stellar_sequence, check_sequence_quality
+from chaotic_generator import available_backends, henon_backend, NUMBA_AVAILABLE, HenonStream, KeystreamIndex
+from chaotic_generator import autocorrelation, SequenceQualityMonitor, generate_stellar_batch, henon_batch
+from chaotic_generator import extract_mantissa_bits, MANTISSA_SKIP_BITS
+
+# Seed whose Hénon orbit is known to stay bounded
+TEST_SEED = 203348544782560449768143188810317800158
 
 class TestCosmicCipher(unittest.TestCase):
     def test_quantum_seed_generation(self):
         seed, quantum_used = generate_cosmic_seed(bytes=16)
         self.assertIsInstance(seed, int)
-        self.assertGreaterEqual(seed.bit_length(), 120)  # Allow for leading zeros
+        self.assertTrue(0 <= seed < 2**128)
+        self.assertNotEqual(seed, generate_cosmic_seed(bytes=16)[0])
         
     def test_encryption_decryption(self):
         test_cases = [
@@ -16,8 +50,8 @@ class TestCosmicCipher(unittest.TestCase):
             "A" * 1000  # Test long messages
         ]
         
-        seed, _ = generate_cosmic_seed()
-        seq = generate_stellar_sequence(seed, length=10000)
+        # Random seeds diverge about one time in six; keys are used with an IV
+        seq = generate_stellar_sequence(TEST_SEED, length=10000)
         keystream = chaotic_to_keystream(seq)
         
         for text in test_cases:
@@ -26,6 +60,86 @@ class TestCosmicCipher(unittest.TestCase):
                 decrypted = decrypt(ciphertext, keystream)
                 self.assertEqual(text, decrypted)
     
+    def test_bytes_encryption_decryption(self):
+        seq = generate_stellar_sequence(TEST_SEED, length=5000)
+        keystream = chaotic_to_keystream_bytes(seq)
+        self.assertEqual(keystream.dtype, np.uint8)
+        
+        data = "Hello, World! 🌎".encode('utf-8') + bytes(range(256))
+        ciphertext = encrypt_bytes(data, keystream)
+        self.assertNotEqual(data, ciphertext)
+        self.assertEqual(data, decrypt_bytes(bytearray(ciphertext), keystream))
+        
+        with self.assertRaises(ValueError):
+            encrypt_bytes(bytes(10), keystream[:5])  # Keystream too short
+    
+    def test_encrypt_into_buffers(self):
+        keystream = chaotic_to_keystream_bytes(generate_stellar_sequence(TEST_SEED, 1000))
+        message = "Buffer ✓ message".encode('utf-8')
+        expected = encrypt_bytes(message, keystream)
+        
+        dst = bytearray(len(message) + 10)
+        self.assertEqual(encrypt_into(message, dst, keystream), len(message))
+        self.assertEqual(bytes(dst[:len(message)]), expected)
+        self.assertFalse(any(dst[len(message):]))
+        
+        # In place over bytearray, NumPy arrays, memoryview slices and mmap
+        in_place = bytearray(message)
+        encrypt_into(in_place, in_place, keystream)
+        self.assertEqual(bytes(in_place), expected)
+        array = np.frombuffer(message, dtype=np.uint8).copy().reshape(2, -1)
+        decrypt_into(expected, array, keystream)
+        self.assertEqual(array.tobytes(), message)
+        padded = bytearray(b'##' + expected)
+        decrypt_into(memoryview(padded)[2:], memoryview(padded)[2:], keystream)
+        self.assertEqual(bytes(padded[2:]), message)
+        mapped = mmap.mmap(-1, len(message))
+        try:
+            encrypt_into(message, mapped, keystream)
+            self.assertEqual(mapped[:], expected)
+        finally:
+            mapped.close()
+        
+        with self.assertRaises(ValueError):
+            encrypt_into(message, bytes(len(message)), keystream)
+        with self.assertRaises(ValueError):
+            encrypt_into(message, bytearray(3), keystream)
+        with self.assertRaises(ValueError):
+            encrypt_into(message, bytearray(len(message)), keystream[:3])
+        with self.assertRaises(ValueError):
+            decrypt_into(b'', bytearray(1), keystream)
+    
+    def test_legacy_bit_string_codec(self):
+        for text in ["", "Hello", "特殊文字 🌌"]:
+            legacy = ''.join(format(byte, '08b') for byte in text.encode('utf-8'))
+            self.assertEqual(cosmic_cipher.text_to_binary(text), legacy)
+            self.assertEqual(binary_utils.text_to_binary(text), legacy)
+            self.assertEqual(cosmic_cipher.binary_to_text(legacy), text)
+        # A trailing partial byte keeps its int(bits, 2) value
+        self.assertEqual(cosmic_cipher.binary_to_text('01000001' + '1000001'), 'AA')
+        self.assertEqual(bits_to_bytes('010000011').tolist(), [65])
+        # binary_utils substitutes undecodable bytes, cosmic_cipher raises
+        self.assertEqual(binary_utils.binary_to_text('11111111'), '\ufffd')
+        for invalid in ('0102', '01 1', '0１'):
+            with self.subTest(invalid=invalid), self.assertRaises(ValueError):
+                cosmic_cipher.binary_to_text(invalid)
+        with self.assertRaises(UnicodeDecodeError):
+            cosmic_cipher.binary_to_text('11111111')
+    
+    def test_string_api_matches_bytes_api(self):
+        seq = generate_stellar_sequence(TEST_SEED, length=2000)
+        for bits in (3, 8, 13):
+            with self.subTest(bits=bits):
+                packed = np.packbits([int(b) for b in chaotic_to_keystream(seq, bits)][:len(seq) * bits // 8 * 8])
+                np.testing.assert_array_equal(packed, chaotic_to_keystream_bytes(seq, bits))
+        
+        keystream = chaotic_to_keystream(seq)
+        text = "特殊文字テスト"
+        ciphertext = encrypt(text, keystream)
+        self.assertEqual(ciphertext, encrypt(text, chaotic_to_keystream_bytes(seq)))
+        self.assertEqual(bytes(int(ciphertext[i:i+8], 2) for i in range(0, len(ciphertext), 8)),
+                         encrypt_bytes(text.encode('utf-8'), chaotic_to_keystream_bytes(seq)))
+    
     def test_security_checks(self):
         with self.assertRaises(ValueError):
             generate_cosmic_seed(bytes=8)  # Too few bytes
@@ -41,28 +155,1013 @@ class TestCosmicCipher(unittest.TestCase):
 
     def test_authenticated_encryption(self):
         """Test HMAC authentication and IV support."""
-        key, _, iv = generate_cosmic_seed()
+        key, _ = generate_cosmic_seed()
+        iv = generate_iv(key)
         message = "Secret message 🔒"
         
         encrypted = encrypt_authenticated(message, key, iv)
         self.assertIn('mac', encrypted)
         self.assertIn('iv', encrypted)
+        self.assertEqual(encrypted['length'], len(message.encode('utf-8')))
         
         decrypted = decrypt_authenticated(encrypted, key)
         self.assertEqual(message, decrypted)
         
         # Test tampering detection
-        encrypted['ciphertext'] = encrypted['ciphertext'][:-1] + '1'
+        last_bit = '0' if encrypted['ciphertext'][-1] == '1' else '1'
+        encrypted['ciphertext'] = encrypted['ciphertext'][:-1] + last_bit
+        with self.assertRaises(ValueError):
+            decrypt_authenticated(encrypted, key)
+    
+    def test_authenticated_long_messages(self):
+        """Keystream length follows the encoded size, so long messages round-trip."""
+        key, _ = generate_cosmic_seed()
+        for message in ("🌌" * 2000, "A" * 20000):
+            with self.subTest(length=len(message)):
+                encrypted = encrypt_authenticated(message, key)
+                self.assertEqual(len(encrypted['ciphertext']), encrypted['length'] * 8)
+                self.assertEqual(decrypt_authenticated(encrypted, key), message)
+        
+        del encrypted['length']  # Outputs without a recorded length still decrypt
+        self.assertEqual(decrypt_authenticated(encrypted, key), "A" * 20000)
+        encrypted['length'] = 5
         with self.assertRaises(ValueError):
             decrypt_authenticated(encrypted, key)
     
     def test_sequence_quality(self):
         """Test chaotic sequence quality checks."""
-        seed, _ = generate_cosmic_seed()[:2]
-        sequence = generate_stellar_sequence(seed, quality_check=True)
+        sequence = generate_stellar_sequence(TEST_SEED, quality_check=True)
         
         # Verify sequence properties
         self.assertTrue(check_sequence_quality(sequence))
+        self.assertTrue(check_sequence_quality(sequence, method='direct'))
+    
+    def test_mantissa_extraction(self):
+        sequence = generate_stellar_sequence(TEST_SEED, 4000)
+        keystream = extract_mantissa_bits(sequence, 32)
+        self.assertEqual(len(keystream), 4 * len(sequence))
+        expected = (int(sequence[:1].view(np.uint64)[0]) >> MANTISSA_SKIP_BITS) & 0xFFFFFFFF
+        self.assertEqual(keystream[:4].tobytes(), expected.to_bytes(4, 'big'))
+        # Odd widths pack the same bits as their MSB-first concatenation
+        odd = extract_mantissa_bits(sequence[:8], 12)
+        joined = ''.join(f"{(int(v) >> MANTISSA_SKIP_BITS) & 0xFFF:012b}" for v in sequence[:8].view(np.uint64))
+        self.assertEqual(odd.tobytes(), int(joined, 2).to_bytes(12, 'big'))
+        # Roughly uniform bytes: chi-square well below the 255-dof tail
+        counts = np.bincount(keystream, minlength=256)
+        expected_count = len(keystream) / 256
+        self.assertLess(((counts - expected_count) ** 2 / expected_count).sum(), 400)
+        
+        whitened = cosmic_cipher.generate_keystream(TEST_SEED, 100, bits_per_value=32, extraction='whitened')
+        longer = cosmic_cipher.generate_keystream(TEST_SEED, 300, bits_per_value=32, extraction='whitened')
+        self.assertEqual(longer[:400].tobytes(), whitened.tobytes())
+        with self.assertRaises(ValueError):
+            extract_mantissa_bits(sequence, 40)
+    
+    def test_fft_autocorrelation(self):
+        sequence = generate_stellar_sequence(TEST_SEED, length=3000)
+        np.testing.assert_allclose(autocorrelation(sequence), autocorrelation(sequence, 'direct'),
+                                   atol=1e-9)
+        
+        periodic = np.tile(np.linspace(-1, 1, 50), 40)
+        self.assertFalse(check_sequence_quality(periodic))
+    
+    def test_quality_monitor_aborts_early(self):
+        monitor = SequenceQualityMonitor(window=1000)
+        good = generate_stellar_sequence(TEST_SEED, length=2500)
+        for start in range(0, len(good), 700):
+            monitor.update(good[start:start + 700])
+        self.assertEqual(monitor.windows_checked, 2)
+        
+        with self.assertRaises(ValueError):
+            monitor.update(np.tile(np.linspace(-1, 1, 50), 40))
+        self.assertTrue(monitor.failed)
+        
+        stream = HenonStream(TEST_SEED, chunk_size=512, quality_monitor=SequenceQualityMonitor())
+        stream.read(10000)
+        self.assertEqual(stream.quality_monitor.windows_checked, 2)
+
+class TestHenonBackends(unittest.TestCase):
+    def test_default_backend(self):
+        self.assertIn(henon_backend(), available_backends())
+        self.assertEqual(henon_backend(), 'numba' if NUMBA_AVAILABLE else 'python')
+        with self.assertRaises(ValueError):
+            generate_stellar_sequence(TEST_SEED, backend='fortran')
+    
+    @unittest.skipUnless(NUMBA_AVAILABLE, "numba not installed")
+    def test_backends_bit_identical(self):
+        """Ciphertexts depend on the sequence, so backends must agree exactly."""
+        rng = np.random.default_rng(1234)
+        for seed in [TEST_SEED] + [int(v) for v in rng.integers(0, 2**63, 50)]:
+            for a, b in ((1.4, 0.3), (1.2, 0.25)):
+                outputs = []
+                for backend in ('numba', 'python'):
+                    try:
+                        outputs.append(generate_stellar_sequence(seed, 5000, a, b, backend=backend).tobytes())
+                    except OverflowError:
+                        outputs.append('diverged')
+                with self.subTest(seed=seed, a=a, b=b):
+                    self.assertEqual(outputs[0], outputs[1])
+
+    def test_batch_matches_single_seed(self):
+        rng = np.random.default_rng(99)
+        seeds = [TEST_SEED] + [int(v) for v in rng.integers(0, 2**63, 40)]
+        for backend in available_backends():
+            with self.subTest(backend=backend):
+                batch = generate_stellar_batch(seeds, 3000, backend=backend, allow_divergence=True)
+                self.assertEqual(batch.shape, (len(seeds), 3000))
+                for seed, row in zip(seeds, batch):
+                    try:
+                        expected = generate_stellar_sequence(seed, 3000)
+                    except OverflowError:
+                        self.assertFalse(np.isfinite(row[-1]))
+                        continue
+                    self.assertEqual(row.tobytes(), expected.tobytes())
+                with self.assertRaises(OverflowError):
+                    generate_stellar_batch(seeds, 3000, backend=backend)
+    
+    def test_batch_variable_lengths(self):
+        x0, y0 = np.array([0.1, 0.2, 0.3]), np.array([0.0, 0.1, -0.1])
+        for backend in available_backends():
+            out = henon_batch(x0, y0, [5, 50, 20], backend=backend)
+            self.assertEqual(out.shape, (3, 50))
+            self.assertFalse(out[0, 5:].any())
+            np.testing.assert_array_equal(out[2, :20], henon_batch(x0[2:], y0[2:], [20], backend=backend)[0])
+        # Enough rows that the NumPy kernel stages its steps in several blocks
+        rng = np.random.default_rng(3)
+        x0, y0 = rng.uniform(-0.5, 0.5, 2100), rng.uniform(-0.1, 0.1, 2100)
+        lengths = rng.integers(0, 1500, 2100)
+        outputs = [henon_batch(x0, y0, lengths, backend=backend) for backend in available_backends()]
+        for row in (0, 7, 2099):
+            self.assertFalse(outputs[0][row, lengths[row]:].any())
+        self.assertEqual(len({out.tobytes() for out in outputs}), 1)
+        
+        self.assertEqual(generate_stellar_batch([], 100).shape, (0, 100))
+        with mock.patch('chaotic_generator.MAX_BATCH_ELEMENTS', 100), self.assertRaises(ValueError):
+            henon_batch(x0[:3], y0[:3], [5, 50, 20])
+    
+    def test_lanes_bit_identical(self):
+        for lanes in (2, 8, 64):
+            outputs = [generate_stellar_sequence(TEST_SEED, 5001, lanes=lanes, backend=backend).tobytes()
+                       for backend in available_backends()]
+            with self.subTest(lanes=lanes):
+                self.assertEqual(len(outputs[0]), 5001 * 8)
+                self.assertEqual(len(set(outputs)), 1)
+        self.assertNotEqual(generate_stellar_sequence(TEST_SEED, 1000, lanes=4).tobytes(),
+                            generate_stellar_sequence(TEST_SEED, 1000).tobytes())
+
+class TestHenonStream(unittest.TestCase):
+    def test_matches_full_sequence(self):
+        expected = chaotic_to_keystream_bytes(generate_stellar_sequence(TEST_SEED, length=5000))
+        stream = HenonStream(TEST_SEED, chunk_size=256)
+        pieces = [stream.read(n) for n in (1, 999, 256, 3744)]
+        np.testing.assert_array_equal(np.concatenate(pieces), expected)
+        self.assertEqual(stream.position, 5000)
+    
+    def test_chunks(self):
+        stream = HenonStream(TEST_SEED, chunk_size=300)
+        chunks = list(stream.chunks(1000))
+        self.assertEqual([len(c) for c in chunks], [300, 300, 300, 100])
+        np.testing.assert_array_equal(np.concatenate(chunks), HenonStream(TEST_SEED).read(1000))
+    
+    def test_state_resume(self):
+        stream = HenonStream(TEST_SEED, a=1.3, b=0.25)
+        stream.read(1234)
+        resumed = HenonStream.from_state(stream.state())
+        self.assertEqual(resumed.position, 1234)
+        np.testing.assert_array_equal(resumed.read(500), stream.read(500))
+        
+        with self.assertRaises(ValueError):
+            HenonStream.from_state(b'garbage')
+    
+    def test_stream_encryption(self):
+        data = bytes(range(256)) * 40
+        chunks = [data[i:i+1000] for i in range(0, len(data), 1000)]
+        ciphertext = b''.join(encrypt_stream(chunks, HenonStream(TEST_SEED, chunk_size=512)))
+        self.assertEqual(ciphertext, encrypt_bytes(data, HenonStream(TEST_SEED).read(len(data))))
+        
+        plaintext = b''.join(decrypt_stream([ciphertext[:7], ciphertext[7:]], HenonStream(TEST_SEED)))
+        self.assertEqual(plaintext, data)
+
+class TestKeystreamIndex(unittest.TestCase):
+    def setUp(self):
+        self.keystream = HenonStream(TEST_SEED).read(10000)
+    
+    def test_recorded_index_matches_build(self):
+        stream = HenonStream(TEST_SEED, chunk_size=700, checkpoint_interval=1000)
+        stream.read(10000)
+        recorded = stream.index()
+        built = KeystreamIndex.build(TEST_SEED, 10000, interval=1000)
+        self.assertEqual(len(recorded.checkpoints), 11)
+        np.testing.assert_array_equal(recorded.checkpoints, built.checkpoints)
+    
+    def test_random_access(self):
+        index = KeystreamIndex.build(TEST_SEED, 10000, interval=1000)
+        for position in (0, 999, 1000, 4321, 9999):
+            with self.subTest(position=position):
+                stream = index.stream_at(position)
+                np.testing.assert_array_equal(stream.read(1), self.keystream[position:position+1])
+        
+        stream = HenonStream(TEST_SEED)
+        stream.read(8000)
+        stream.seek(2500, index)  # backwards via checkpoint
+        np.testing.assert_array_equal(stream.read(100), self.keystream[2500:2600])
+        with self.assertRaises(ValueError):
+            stream.seek(0)
+    
+    def test_serialization(self):
+        index = KeystreamIndex.build(TEST_SEED, 5000, interval=512, a=1.3, b=0.25)
+        restored = KeystreamIndex.from_bytes(index.to_bytes())
+        self.assertEqual((restored.a, restored.b, restored.interval), (1.3, 0.25, 512))
+        np.testing.assert_array_equal(restored.checkpoints, index.checkpoints)
+        with self.assertRaises(ValueError):
+            KeystreamIndex.from_bytes(index.to_bytes()[:-1])
+    
+    def test_decrypt_range(self):
+        data = bytes(range(256)) * 39
+        ciphertext = encrypt_bytes(data, self.keystream)
+        index = KeystreamIndex.build(TEST_SEED, len(data), interval=1024)
+        self.assertEqual(decrypt_range(ciphertext[5000:5100], 5000, index=index), data[5000:5100])
+        self.assertEqual(decrypt_range(ciphertext[17:40], 17, seed=TEST_SEED), data[17:40])
+        with self.assertRaises(ValueError):
+            decrypt_range(ciphertext[:10], 0)
+
+class TestFileCipher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.key = 0xC05A1C
+    
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+    
+    def write(self, name, data):
+        with open(self.path(name), 'wb') as f:
+            f.write(data)
+    
+    def read(self, name):
+        with open(self.path(name), 'rb') as f:
+            return f.read()
+    
+    def test_round_trip(self):
+        data = os.urandom(100000)
+        self.write('plain', data)
+        iv = generate_iv(self.key)
+        stats = encrypt_file(self.path('plain'), self.path('enc'), self.key, iv=iv, chunk_size=4096)
+        self.assertEqual(stats['bytes'], len(data))
+        self.assertGreater(stats['mb_per_s'], 0)
+        
+        ciphertext = self.read('enc')[HEADER_SIZE:HEADER_SIZE + len(data)]
+        self.assertEqual(ciphertext, encrypt_bytes(data, HenonStream(self.key ^ iv).read(len(data))))
+        
+        decrypt_file(self.path('enc'), self.path('dec'), self.key, chunk_size=3000)
+        self.assertEqual(self.read('dec'), data)
+    
+    def test_empty_file(self):
+        self.write('plain', b'')
+        encrypt_file(self.path('plain'), self.path('enc'), self.key)
+        decrypt_file(self.path('enc'), self.path('dec'), self.key)
+        self.assertEqual(self.read('dec'), b'')
+    
+    def test_tampering_detected(self):
+        self.write('plain', b'attack at dawn' * 100)
+        encrypt_file(self.path('plain'), self.path('enc'), self.key)
+        tampered = bytearray(self.read('enc'))
+        tampered[HEADER_SIZE + 10] ^= 1
+        self.write('enc', bytes(tampered))
+        with self.assertRaises(ValueError):
+            decrypt_file(self.path('enc'), self.path('dec'), self.key)
+        self.assertFalse(os.path.exists(self.path('dec')))
+        with self.assertRaises(ValueError):
+            decrypt_file(self.path('plain'), self.path('dec'), self.key)
+        # A failed run leaves an existing destination untouched
+        self.write('dec', b'previous')
+        with self.assertRaises(ValueError):
+            decrypt_file(self.path('enc'), self.path('dec'), self.key)
+        self.assertEqual(self.read('dec'), b'previous')
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ['dec', 'enc', 'plain'])
+    
+    def test_in_place(self):
+        data = os.urandom(50000)
+        self.write('file', data)
+        encrypt_file(self.path('file'), self.path('file'), self.key)
+        self.assertEqual(os.path.getsize(self.path('file')), HEADER_SIZE + len(data) + envelope.MAC_SIZE)
+        decrypt_file(self.path('file'), self.path('file'), self.key)
+        self.assertEqual(self.read('file'), data)
+        self.assertEqual(os.listdir(self.tmp.name), ['file'])
+
+class TestSegmentedCipher(unittest.TestCase):
+    def test_round_trip(self):
+        data = os.urandom(10000)
+        ciphertext = encrypt_segmented(data, TEST_SEED, 42, segment_size=1024, workers=2)
+        self.assertEqual(len(ciphertext), len(data))
+        self.assertEqual(decrypt_segmented(ciphertext, TEST_SEED, 42, segment_size=1024, workers=2), data)
+    
+    def test_segments_are_independent(self):
+        data = bytes(5000)
+        ciphertext = encrypt_segmented(data, TEST_SEED, 7, segment_size=2048, workers=2)
+        keystream = np.concatenate([segment_keystream(TEST_SEED ^ 7, i, n)
+                                    for i, n in enumerate((2048, 2048, 904))])
+        self.assertEqual(ciphertext, keystream.tobytes())
+        # A single segment is processed inline and must agree with the pool
+        self.assertEqual(encrypt_segmented(data[:2048], TEST_SEED, 7, segment_size=2048),
+                         ciphertext[:2048])
+        with self.assertRaises(ValueError):
+            encrypt_segmented(b'', TEST_SEED, 7)
+
+class TestKeystreamCache(unittest.TestCase):
+    def test_lru_eviction_and_zeroization(self):
+        cache = KeystreamCache(max_bytes=250)
+        first = np.full(100, 7, dtype=np.uint8)
+        cache.put(1, first)
+        cache.put(2, np.full(100, 8, dtype=np.uint8))
+        self.assertIsNotNone(cache.get(1, 100))  # 1 becomes most recent
+        cache.put(3, np.full(100, 9, dtype=np.uint8))
+        
+        self.assertIsNone(cache.get(2, 100))
+        np.testing.assert_array_equal(cache.get(1, 50), np.full(50, 7))
+        self.assertIsNone(cache.get(1, 101))  # Longer than cached
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (2, 2, 1))
+        self.assertEqual(stats['bytes'], 200)
+        
+        stored = cache._entries[(1, 1.4, 0.3, 8, 1, 'fractional')]
+        cache.clear()
+        self.assertFalse(stored.any())
+        self.assertEqual(cache.stats()['bytes'], 0)
+    
+    def test_returned_keystream_is_a_copy(self):
+        cache = KeystreamCache()
+        cache.put(1, np.arange(10, dtype=np.uint8))
+        cache.get(1, 10)[:] = 0
+        np.testing.assert_array_equal(cache.get(1, 10), np.arange(10))
+    
+    def test_authenticated_functions_use_cache(self):
+        cache = cosmic_cipher.enable_keystream_cache()
+        self.addCleanup(cosmic_cipher.disable_keystream_cache)
+        expected = chaotic_to_keystream_bytes(generate_stellar_sequence(TEST_SEED, 3000))
+        np.testing.assert_array_equal(cosmic_cipher.generate_keystream(TEST_SEED, 3000), expected)
+        np.testing.assert_array_equal(cosmic_cipher.generate_keystream(TEST_SEED, 1000), expected[:1000])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+class TestMacModes(unittest.TestCase):
+    def test_round_trip_and_tampering(self):
+        key = 0xC05A1C
+        message = "MAC mode message 🔒" * 100
+        for mac_mode in cosmic_cipher.MAC_MODES:
+            with self.subTest(mac_mode=mac_mode):
+                encrypted = encrypt_authenticated(message, key, mac_mode=mac_mode)
+                self.assertEqual(encrypted['mac_mode'], mac_mode)
+                self.assertEqual(decrypt_authenticated(encrypted, key), message)
+                self.assertEqual(decrypt_many([encrypted], key)[0].value, message)
+                
+                flipped = '1' if encrypted['ciphertext'][-1] == '0' else '0'
+                for tampered in (dict(encrypted, ciphertext=encrypted['ciphertext'][:-1] + flipped),
+                                 dict(encrypted, ciphertext=encrypted['ciphertext'] + '0'),
+                                 dict(encrypted, mac_mode=next(m for m in cosmic_cipher.MAC_MODES if m != mac_mode))):
+                    with self.assertRaises(ValueError):
+                        decrypt_authenticated(tampered, key)
+        # A MAC from one mode never verifies under another
+        encrypted = encrypt_authenticated('A', key)
+        rewrapped = binary_utils.bytes_to_bits(encrypted['ciphertext'].encode())
+        for mac_mode in ('bytes', 'tree'):
+            for options in ({}, {'extraction': 'whitened', 'bits_per_value': 4, 'lanes': 2}):
+                replayed = dict(encrypted, ciphertext=rewrapped, mac_mode=mac_mode, **options)
+                del replayed['length']
+                with self.subTest(replayed=mac_mode, **options), \
+                        self.assertRaisesRegex(ValueError, "authentication failed"):
+                    decrypt_authenticated(replayed, key)
+        # Outputs predating mac_mode are bit-string HMACs
+        legacy = encrypt_authenticated(message, key)
+        del legacy['mac_mode']
+        # New outputs never carry the untagged MAC, so dropping mac_mode fails
+        with self.assertRaises(ValueError):
+            decrypt_authenticated(legacy, key)
+        legacy['mac'] = hmac.new(key.to_bytes(32, 'big'), legacy['ciphertext'].encode(), hashlib.sha256).hexdigest()
+        self.assertEqual(decrypt_authenticated(legacy, key), message)
+        self.assertEqual(decrypt_many([legacy], key)[0].value, message)
+        # The IV is covered by the MAC of default outputs
+        encrypted = encrypt_authenticated('hi', key)
+        swapped = dict(encrypted, iv=hex(generate_iv(key))[2:])
+        with self.assertRaisesRegex(ValueError, "authentication failed"):
+            decrypt_authenticated(swapped, key)
+        self.assertIsInstance(decrypt_many([swapped], key)[0].error, ValueError)
+        self.assertEqual(encrypt_many(['hi'], key, [int(encrypted['iv'], 16)])[0].value, encrypted)
+        with self.assertRaises(ValueError):
+            encrypt_authenticated(message, key, mac_mode='crc')
+    
+    def test_tree_mac(self):
+        key, data = b'k' * 32, os.urandom(100_000)
+        root = tree_mac(key, data, leaf_size=4096)
+        self.assertEqual(len(root), 32)
+        self.assertEqual(tree_mac(key, data, leaf_size=4096, workers=1), root)
+        self.assertEqual(tree_mac(key, np.frombuffer(data, dtype=np.uint8), leaf_size=4096), root)
+        self.assertNotEqual(tree_mac(key, data, leaf_size=8192), root)
+        self.assertNotEqual(tree_mac(b'K' * 32, data, leaf_size=4096), root)
+        self.assertNotEqual(tree_mac(key, data[:-1], leaf_size=4096), root)
+        self.assertNotEqual(tree_mac(key, data[:4096], leaf_size=4096), tree_mac(key, data[:4096] + b'\0', leaf_size=4096))
+        with self.assertRaises(ValueError):
+            tree_mac(b'', data)
+
+class TestKeystreamPrefetcher(unittest.TestCase):
+    def wait_for_depth(self, prefetcher, depth):
+        deadline = time.monotonic() + 30
+        while prefetcher.stats()['depth'] < depth:
+            self.assertLess(time.monotonic(), deadline, "prefetcher did not refill")
+            time.sleep(0.01)
+    
+    def test_prefetched_pads_round_trip(self):
+        key = 0xC05A1C
+        with KeystreamPrefetcher(key, pad_size=256, depth=4, workers=2) as prefetcher:
+            self.wait_for_depth(prefetcher, 4)
+            encrypted = [encrypt_authenticated(f"message {i}", key, prefetcher=prefetcher) for i in range(3)]
+            packed = encrypt_authenticated_bytes(b'binary payload', key, prefetcher=prefetcher)
+            self.assertEqual(len({e['iv'] for e in encrypted}), 3)
+            self.assertEqual([decrypt_authenticated(e, key) for e in encrypted], [f"message {i}" for i in range(3)])
+            self.assertEqual(decrypt_authenticated_bytes(packed, key), b'binary payload')
+            
+            # Oversized messages are served inline and counted
+            long_message = "x" * 1000
+            self.assertEqual(decrypt_authenticated(encrypt_authenticated(long_message, key, prefetcher=prefetcher), key),
+                             long_message)
+            stats = prefetcher.stats()
+            self.assertEqual((stats['consumed'], stats['oversize']), (4, 1))
+            self.assertGreaterEqual(stats['produced'], 4)
+            self.assertEqual(stats['capacity'], 4)
+            
+            with self.assertRaises(ValueError):
+                encrypt_authenticated("wrong key", key + 1, prefetcher=prefetcher)
+            with self.assertRaises(ValueError):
+                encrypt_authenticated("fixed iv", key, iv=42, prefetcher=prefetcher)
+    
+    def test_starvation_and_close(self):
+        key = 0xC05A1C
+        prefetcher = KeystreamPrefetcher(key, pad_size=64, depth=2, extraction='mantissa')
+        self.wait_for_depth(prefetcher, 2)
+        queued = [pad for _, pad in list(prefetcher._queue.queue)]
+        prefetcher.close()
+        # Pads still queued at close are zeroed and dropped, so callers starve
+        self.assertFalse(any(pad.any() for pad in queued))
+        self.assertIsNone(prefetcher.pop(8))
+        encrypted = encrypt_authenticated("served inline", key, prefetcher=prefetcher)
+        self.assertEqual(encrypted['extraction'], 'mantissa')
+        self.assertEqual(decrypt_authenticated(encrypted, key), "served inline")
+        self.assertGreaterEqual(prefetcher.stats()['starved'], 2)
+
+class TestEnvelope(unittest.TestCase):
+    def test_round_trip(self):
+        key = 0xC05A1C
+        message = "Secret message 🔒".encode('utf-8')
+        packed = encrypt_authenticated_bytes(message, key, iv=42, a=1.3, b=0.25)
+        self.assertEqual(len(packed), envelope.HEADER_SIZE + len(message) + envelope.MAC_SIZE)
+        
+        parsed = envelope.unpack(packed)
+        self.assertEqual((parsed.version, parsed.a, parsed.b, parsed.iv), (envelope.VERSION, 1.3, 0.25, 42))
+        self.assertIsInstance(parsed.ciphertext, memoryview)
+        self.assertEqual(decrypt_authenticated_bytes(packed, key), message)
+        self.assertEqual(decrypt_authenticated_bytes(encrypt_authenticated_bytes(message, key), key), message)
+    
+    def test_file_output_is_an_envelope(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src, dst = os.path.join(tmp, 'plain'), os.path.join(tmp, 'enc')
+            with open(src, 'wb') as f:
+                f.write(b'cosmic' * 1000)
+            encrypt_file(src, dst, 0xC05A1C)
+            with open(dst, 'rb') as f:
+                self.assertEqual(decrypt_authenticated_bytes(f.read(), 0xC05A1C), b'cosmic' * 1000)
+    
+    def test_rejects_tampering_and_malformed_input(self):
+        packed = bytearray(encrypt_authenticated_bytes(b'payload', 0xC05A1C, iv=42))
+        for position in (5, envelope.HEADER_SIZE + 1, len(packed) - 1):
+            tampered = bytearray(packed)
+            tampered[position] ^= 1
+            with self.subTest(position=position), self.assertRaises(ValueError):
+                decrypt_authenticated_bytes(tampered, 0xC05A1C)
+        with self.assertRaises(ValueError):
+            envelope.unpack(packed[:-1])
+        with self.assertRaises(ValueError):
+            envelope.unpack(b'XXXX' + packed[4:])
+    
+    def test_lanes_recorded(self):
+        key, message = 0xC05A1C, b'multi-lane payload' * 40
+        packed = encrypt_authenticated_bytes(message, key, iv=42, lanes=8)
+        self.assertEqual(envelope.unpack(packed).lanes, 8)
+        self.assertEqual(decrypt_authenticated_bytes(packed, key), message)
+        
+        encrypted = encrypt_authenticated("multi-lane text", key, lanes=4)
+        self.assertEqual(encrypted['lanes'], 4)
+        self.assertEqual(decrypt_authenticated(encrypted, key), "multi-lane text")
+        self.assertEqual(decrypt_many([encrypted], key)[0].value, "multi-lane text")
+        
+        # Lanes, extraction, IV and length are covered by the MAC
+        plain = encrypt_authenticated('hi', key)
+        for tampered in (dict(encrypted, lanes=3), dict(encrypted, lanes=1),
+                         dict(encrypted, iv=hex(int(encrypted['iv'], 16) ^ 1)[2:]),
+                         dict(plain, lanes=3, extraction='mantissa', bits_per_value=1)):
+            with self.assertRaises(ValueError):
+                decrypt_authenticated(tampered, key)
+            self.assertIsInstance(decrypt_many([tampered], key)[0].error, ValueError)
+        for lanes in (0, 256):
+            with self.assertRaises(ValueError):
+                encrypt_authenticated_bytes(message, key, lanes=lanes)
+            with self.assertRaises(ValueError):
+                encrypt_authenticated("text", key, lanes=lanes)
+    
+    def test_older_envelopes_parse(self):
+        packed = encrypt_authenticated_bytes(b'payload', 0xC05A1C, iv=42)
+        # Version 2 lacks the trailing extraction fields, version 1 also the lane count
+        for version, dropped in ((2, 2), (1, 3)):
+            old = (envelope.MAGIC + bytes([version]) + packed[5:envelope.HEADER_SIZE - dropped]
+                   + packed[envelope.HEADER_SIZE:])
+            parsed = envelope.unpack(old)
+            with self.subTest(version=version):
+                self.assertEqual((parsed.version, parsed.lanes, parsed.extraction, parsed.bits_per_value),
+                                 (version, 1, 'fractional', 8))
+                self.assertEqual(bytes(parsed.ciphertext), bytes(envelope.unpack(packed).ciphertext))
+    
+    def test_mantissa_extraction_recorded(self):
+        key, message = 0xC05A1C, bytes(range(256)) * 20
+        for extraction, bits in (('mantissa', None), ('mantissa', 12), ('whitened', 24)):
+            with self.subTest(extraction=extraction, bits=bits):
+                packed = encrypt_authenticated_bytes(message, key, iv=42, extraction=extraction,
+                                                     bits_per_value=bits, lanes=2)
+                parsed = envelope.unpack(packed)
+                self.assertEqual((parsed.extraction, parsed.bits_per_value),
+                                 (extraction, bits or cosmic_cipher.DEFAULT_BITS_PER_VALUE[extraction]))
+                self.assertEqual(decrypt_authenticated_bytes(packed, key), message)
+                
+                encrypted = encrypt_authenticated("mantissa text", key, extraction=extraction,
+                                                  bits_per_value=bits)
+                self.assertEqual(decrypt_authenticated(encrypted, key), "mantissa text")
+                self.assertEqual(decrypt_many([encrypted], key)[0].value, "mantissa text")
+        with self.assertRaises(ValueError):
+            encrypt_authenticated_bytes(message, key, extraction='exponent')
+        for bits in (0, 33, 256):
+            with self.subTest(bits=bits), self.assertRaises(ValueError):
+                encrypt_authenticated_bytes(message, key, bits_per_value=bits)
+            with self.subTest(bits=bits), self.assertRaises(ValueError):
+                encrypt_authenticated("x", key, extraction='mantissa', bits_per_value=bits)
+        # Extraction and bits per iterate are covered by the MAC
+        encrypted = encrypt_authenticated("mantissa text", key, extraction='mantissa')
+        for tampered in (dict(encrypted, extraction='whitened'), dict(encrypted, bits_per_value=16),
+                         dict(encrypted, bits_per_value=0)):
+            with self.assertRaises(ValueError):
+                decrypt_authenticated(tampered, key)
+
+class TestChunkedStream(unittest.TestCase):
+    key = 0xC05A1C
+    
+    def encrypt(self, message, chunk_size=1000):
+        pieces = [message[i:i + 333] for i in range(0, len(message), 333)]
+        return b''.join(encrypt_stream_authenticated(pieces, self.key, chunk_size=chunk_size))
+    
+    def records(self, packed, chunk_size=1000):
+        """Split packed output into its header and per-chunk records."""
+        header, rest = packed[:envelope.STREAM_HEADER_SIZE], packed[envelope.STREAM_HEADER_SIZE:]
+        records = []
+        while rest:
+            _, length = envelope.unpack_record_prefix(rest)
+            end = envelope.RECORD_SIZE + length + envelope.MAC_SIZE
+            records.append(rest[:end])
+            rest = rest[end:]
+        return header, records
+    
+    def test_round_trip_any_split(self):
+        for size in (0, 1, 999, 1000, 1001, 5000):
+            message = os.urandom(size)
+            packed = self.encrypt(message)
+            for step in (1, 7, 1042, len(packed)):
+                pieces = [packed[i:i + step] for i in range(0, len(packed), step)]
+                with self.subTest(size=size, step=step):
+                    self.assertEqual(b''.join(decrypt_stream_authenticated(pieces, self.key)), message)
+            self.assertEqual(len(self.records(packed)[1]), max(1, -(-size // 1000)))
+    
+    def test_rejects_at_first_bad_chunk(self):
+        message = os.urandom(5000)
+        header, records = self.records(self.encrypt(message))
+        tampered = bytearray(records[2])
+        tampered[envelope.RECORD_SIZE] ^= 1
+        decryptor = StreamDecryptor(self.key)
+        released = decryptor.update(header + b''.join(records[:2]))
+        self.assertEqual(b''.join(released), message[:2000])
+        with self.assertRaises(ValueError):
+            decryptor.update(bytes(tampered))
+        
+        bad_streams = {
+            'reordered': [header, records[1], records[0]] + records[2:],
+            'truncated': [header] + records[:-1],
+            'trailing': [header] + records + [b'x'],
+            'final dropped early': [header, records[-1]],
+            'wrong key stream': [self.encrypt(message)[:envelope.STREAM_HEADER_SIZE]] + records,
+        }
+        for name, pieces in bad_streams.items():
+            with self.subTest(name), self.assertRaises(ValueError):
+                list(decrypt_stream_authenticated(pieces, self.key))
+    
+    def test_oversized_chunk_rejected_before_buffering(self):
+        header, _ = self.records(self.encrypt(b'data'))
+        decryptor = StreamDecryptor(self.key)
+        with self.assertRaises(ValueError):
+            decryptor.update(header + b'\0' + b'\xff' * 4)
+        for chunk_size in (0, cosmic_cipher.MAX_STREAM_CHUNK_SIZE + 1):
+            with self.assertRaises(ValueError):
+                StreamEncryptor(self.key, chunk_size=chunk_size)
+        StreamEncryptor(self.key, chunk_size=cosmic_cipher.MAX_STREAM_CHUNK_SIZE)
+    
+    def test_huge_declared_chunk_size_rejected(self):
+        forged = envelope.pack_stream_header(42, 2**32 - 1)
+        with self.assertRaisesRegex(ValueError, "max_chunk_size"):
+            StreamDecryptor(self.key).update(forged)
+        packed = self.encrypt(os.urandom(3000))
+        with self.assertRaises(ValueError):
+            list(decrypt_stream_authenticated([packed], self.key, max_chunk_size=999))
+        self.assertEqual(len(b''.join(decrypt_stream_authenticated([packed], self.key, max_chunk_size=1000))), 3000)
+        # Keystream generation is capped independently of the chunk size
+        decryptor = StreamDecryptor(self.key)
+        decryptor.update(self.encrypt(b'data', chunk_size=1 << 20)[:envelope.STREAM_HEADER_SIZE])
+        self.assertLessEqual(len(decryptor._stream._scratch), 1 << 16)
+
+class _CollectingWriter:
+    """StreamWriter stand-in whose drain() blocks while the gate is closed."""
+    
+    def __init__(self):
+        self.data = bytearray()
+        self.gate = asyncio.Event()
+        self.gate.set()
+    
+    def write(self, data):
+        self.data += data
+    
+    async def drain(self):
+        await self.gate.wait()
+
+class TestAsyncAPI(unittest.IsolatedAsyncioTestCase):
+    key = 0xC05A1C
+    
+    async def test_authenticated_round_trip(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            encrypted = await aio.encrypt_authenticated("async message", self.key, executor=executor)
+            self.assertEqual(await aio.decrypt_authenticated(encrypted, self.key, executor=executor), "async message")
+            packed = await aio.encrypt_authenticated_bytes(b'async bytes', self.key, lanes=2)
+            self.assertEqual(await aio.decrypt_authenticated_bytes(packed, self.key), b'async bytes')
+            seed, _ = await aio.generate_cosmic_seed()
+            self.assertGreater(seed, 0)
+            with self.assertRaises(ValueError):
+                await aio.decrypt_authenticated(dict(encrypted, mac='0' * 64), self.key)
+    
+    async def test_file_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, name) for name in ('plain', 'enc', 'dec')]
+            with open(paths[0], 'wb') as f:
+                f.write(b'async file' * 500)
+            await aio.encrypt_file(paths[0], paths[1], self.key, chunk_size=1024)
+            stats = await aio.decrypt_file(paths[1], paths[2], self.key)
+            self.assertEqual(stats['bytes'], 5000)
+            with open(paths[2], 'rb') as f:
+                self.assertEqual(f.read(), b'async file' * 500)
+    
+    async def test_stream_round_trip(self):
+        message = os.urandom(10_000)
+        reader = asyncio.StreamReader()
+        reader.feed_data(message)
+        reader.feed_eof()
+        encrypted = _CollectingWriter()
+        self.assertEqual(await aio.encrypt_stream(reader, encrypted, self.key, chunk_size=1024), len(message))
+        
+        reader = asyncio.StreamReader()
+        reader.feed_data(bytes(encrypted.data))
+        reader.feed_eof()
+        decrypted = _CollectingWriter()
+        self.assertEqual(await aio.decrypt_stream(reader, decrypted, self.key, read_size=777), len(message))
+        self.assertEqual(bytes(decrypted.data), message)
+        
+        # Chunks the default decryptor would refuse are refused up front
+        oversized = _CollectingWriter()
+        with self.assertRaises(ValueError):
+            await aio.encrypt_stream(asyncio.StreamReader(), oversized, self.key,
+                                     chunk_size=cosmic_cipher.MAX_STREAM_CHUNK_SIZE + 1)
+        self.assertEqual(oversized.data, b'')
+        
+        reader = asyncio.StreamReader()
+        reader.feed_data(bytes(encrypted.data[:-1]))
+        reader.feed_eof()
+        with self.assertRaises(ValueError):
+            await aio.decrypt_stream(reader, _CollectingWriter(), self.key)
+    
+    async def test_backpressure(self):
+        reader = asyncio.StreamReader()
+        reader.feed_data(os.urandom(20 * 1024))
+        reader.feed_eof()
+        writer = _CollectingWriter()
+        writer.gate.clear()
+        task = asyncio.create_task(aio.encrypt_stream(reader, writer, self.key, chunk_size=1024))
+        await asyncio.sleep(0.2)
+        # A blocked consumer stops the encryptor after at most two chunks
+        self.assertLess(len(writer.data), 3 * 1024)
+        self.assertFalse(task.done())
+        writer.gate.set()
+        self.assertEqual(await task, 20 * 1024)
+
+class TestCipherDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'cipher.sock')
+        self.daemon = CipherDaemon(self.path, workers=2, batch_window=0.01)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.daemon.start(), self.loop).result(timeout=60)
+        self.key, _ = generate_cosmic_seed()
+    
+    def tearDown(self):
+        asyncio.run_coroutine_threadsafe(self.daemon.close(), self.loop).result(timeout=60)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.tmp.cleanup()
+    
+    def test_concurrent_clients_are_batched(self):
+        messages = [f"daemon message {i} 🔒" for i in range(80)]
+        with CipherClient(self.path, pool_size=8) as client, ThreadPoolExecutor(max_workers=8) as pool:
+            encrypted = list(pool.map(lambda m: client.encrypt_authenticated(m, self.key), messages))
+            # Interchangeable with the in-process API in both directions
+            self.assertEqual([decrypt_authenticated(e, self.key) for e in encrypted[:5]], messages[:5])
+            local = encrypt_authenticated("local", self.key)
+            self.assertEqual(client.decrypt_authenticated(local, self.key), "local")
+            decrypted = list(pool.map(lambda e: client.decrypt_authenticated(e, self.key), encrypted))
+        self.assertEqual(decrypted, messages)
+        stats = self.daemon.stats()
+        self.assertEqual(stats['requests'], 2 * len(messages) + 1)
+        self.assertGreater(stats['largest_batch'], 1)
+    
+    def test_errors_are_reported_per_request(self):
+        with CipherClient(self.path) as client:
+            encrypted = client.encrypt_authenticated("payload", self.key)
+            with self.assertRaises(ValueError):
+                client.decrypt_authenticated(dict(encrypted, mac='0' * 64), self.key)
+            with self.assertRaises(ValueError):
+                client.encrypt_authenticated("", self.key)
+            with self.assertRaises(ValueError):
+                client.decrypt_authenticated(encrypt_authenticated("x", self.key, lanes=2), self.key)
+            # The connection stays usable after errors
+            self.assertEqual(client.decrypt_authenticated(encrypted, self.key), "payload")
+    
+    def test_worker_failure_answers_every_request(self):
+        with mock.patch.object(CipherDaemon, '_process', side_effect=MemoryError("out of memory")), \
+                CipherClient(self.path, pool_size=4, timeout=30) as client, \
+                ThreadPoolExecutor(max_workers=4) as pool:
+            def call(message):
+                with self.assertRaisesRegex(RuntimeError, "MemoryError"):
+                    client.encrypt_authenticated(message, self.key)
+            list(pool.map(call, ["a", "b", "c", "d"]))
+        self.assertEqual(self.daemon.stats()['pending_bytes'], 0)
+    
+    def test_batches_are_bounded_in_bytes_and_concurrency(self):
+        path = os.path.join(self.tmp.name, 'bounded.sock')
+        daemon = CipherDaemon(path, workers=1, batch_window=0.01, max_batch_bytes=2500)
+        asyncio.run_coroutine_threadsafe(daemon.start(), self.loop).result(timeout=60)
+        running, peak, lock = [0], [0], threading.Lock()
+        process = CipherDaemon._process
+        
+        def tracked(op, key, requests):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            try:
+                time.sleep(0.01)
+                return process(op, key, requests)
+            finally:
+                with lock:
+                    running[0] -= 1
+        
+        try:
+            messages = [f"{i:04d}" * 250 for i in range(12)]
+            with mock.patch.object(CipherDaemon, '_process', side_effect=tracked), \
+                    CipherClient(path, pool_size=12, timeout=30) as client, \
+                    ThreadPoolExecutor(max_workers=12) as pool:
+                encrypted = list(pool.map(lambda m: client.encrypt_authenticated(m, self.key), messages))
+            self.assertEqual([decrypt_authenticated(e, self.key) for e in encrypted], messages)
+            stats = daemon.stats()
+            self.assertLessEqual(stats['largest_batch'], 2)
+            self.assertEqual(peak[0], 1)
+            self.assertEqual(stats['pending_bytes'], 0)
+        finally:
+            asyncio.run_coroutine_threadsafe(daemon.close(), self.loop).result(timeout=60)
+
+class TestKeyStretcher(unittest.TestCase):
+    salt = b'\x5a' * 32
+    
+    def test_chunked_chain_matches_pbkdf2(self):
+        # Without memory_cost a lane chains pbkdf2_hmac calls of CHUNK_ITERATIONS
+        state = b'password'
+        for _ in range(3):
+            state = hashlib.pbkdf2_hmac('sha3_512', state, self.salt + bytes(4), CHUNK_ITERATIONS)
+        state = hashlib.pbkdf2_hmac('sha3_512', state, self.salt + bytes(4), 500)
+        progress = []
+        derived = KeyStretcher(3500)._derive(b'password', self.salt, progress.append)
+        self.assertEqual(derived, hashlib.sha3_512(self.salt + state).digest())
+        self.assertEqual(len(progress), 4)
+        for reported, expected in zip(progress, [1000 / 35, 2000 / 35, 3000 / 35, 100.0]):
+            self.assertAlmostEqual(reported, expected)
+    
+    def test_lanes_and_memory_hard(self):
+        sequential = KeyStretcher(2000, lanes=3, executor=ThreadPoolExecutor(max_workers=1))
+        expected = sequential._derive(b'password', self.salt)
+        self.assertEqual(KeyStretcher(2000, lanes=3)._derive(b'password', self.salt), expected)
+        self.assertNotEqual(KeyStretcher(2000, lanes=2)._derive(b'password', self.salt), expected)
+        
+        hard = KeyStretcher(1000, memory_cost=1 << 10)._derive(b'password', self.salt)
+        self.assertEqual(len(hard), 64)
+        self.assertNotEqual(hard, KeyStretcher(1000)._derive(b'password', self.salt))
+        self.assertEqual(len(KeyStretcher(1000).stretch_key('ab' * 16)), 128)
+        with self.assertRaises(ValueError):
+            KeyStretcher(memory_cost=1000)
+    
+    def test_calibration_and_records(self):
+        stretcher = KeyStretcher.calibrate(0.2, memory_cost=1 << 10)
+        self.assertEqual(stretcher.iterations % CHUNK_ITERATIONS, 0)
+        started = time.perf_counter()
+        stretched = stretcher.derive('ab' * 16)
+        self.assertLess(time.perf_counter() - started, 1.0)
+        
+        record = stretched.to_record()
+        self.assertTrue(record.startswith(f"$cosmic-stretch$i={stretcher.iterations},l=1,m=1024,r=8$"))
+        self.assertEqual(StretchedKey.from_record(record), stretched)
+        self.assertTrue(KeyStretcher.verify('ab' * 16, record))
+        self.assertFalse(KeyStretcher.verify('ab' * 15 + 'ac', stretched))
+        for malformed in ('', '$other$i=1,l=1,m=0,r=8$AA$AA', record.replace('i=', 'x=')):
+            with self.subTest(record=malformed), self.assertRaises(ValueError):
+                StretchedKey.from_record(malformed)
+
+    def test_given_salt_is_deterministic(self):
+        salt = bytes(range(32))
+        stored = KeyStretcher(iterations=2000, salt=salt)
+        self.assertEqual(stored.derive('ab' * 16).salt, salt)
+        self.assertEqual(stored.stretch_key('ab' * 16),
+                         KeyStretcher(iterations=2000).stretch_key('ab' * 16, salt=salt))
+        self.assertNotEqual(stored.stretch_key('ab' * 16, salt=bytes(32)), stored.stretch_key('ab' * 16))
+        fresh = KeyStretcher(iterations=2000)
+        self.assertNotEqual(fresh.derive('ab' * 16).salt, fresh.derive('ab' * 16).salt)
+
+    def test_cache_hits_match_and_are_fast(self):
+        cache = StretchCache()
+        stretcher = KeyStretcher(iterations=20000, salt=bytes(32), cache=cache)
+        started = time.perf_counter()
+        first = stretcher.derive('ab' * 16)
+        cold = time.perf_counter() - started
+        progress = []
+        started = time.perf_counter()
+        second = stretcher.derive('ab' * 16, progress.append)
+        warm = time.perf_counter() - started
+        self.assertEqual(first, second)
+        self.assertEqual(progress, [100.0])
+        self.assertLess(warm, cold / 10)
+        self.assertTrue(KeyStretcher.verify('ab' * 16, first, cache=cache))
+        # Other parameters, salts and keys are distinct entries
+        KeyStretcher(iterations=21000, salt=bytes(32), cache=cache).derive('ab' * 16)
+        stretcher.derive('ab' * 16, salt=bytes(31) + b'\x01')
+        stretcher.derive('cd' * 16)
+        self.assertEqual(cache.stats()['hits'], 2)
+        self.assertEqual(cache.stats()['entries'], 4)
+        # Fresh salts bypass the cache
+        KeyStretcher(iterations=2000, cache=cache).derive('ab' * 16)
+        self.assertEqual(cache.stats()['entries'], 4)
+
+    def test_cache_expiry_and_eviction_zero_keys(self):
+        cache = StretchCache(max_entries=2, ttl=0.05)
+        lookups = [cache.lookup_key(b'key', bytes([i]), (1000, 1, None, 8)) for i in range(3)]
+        for lookup in lookups:
+            cache.put(lookup, b'\x5a' * 64)
+        stored = [entry for entry, _ in cache._entries.values()]
+        self.assertIsNone(cache.get(lookups[0]))
+        self.assertEqual(cache.stats()['evictions'], 1)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get(lookups[2]))
+        stats = cache.stats()
+        self.assertEqual((stats['expirations'], stats['entries']), (2, 0))
+        self.assertTrue(all(entry == bytes(64) for entry in stored))
+        with self.assertRaises(ValueError):
+            StretchCache(max_entries=0)
+
+class _FailingSource:
+    name = 'failing'
+    quantum = True
+
+    def __init__(self):
+        self.calls = 0
+
+    def read(self, size):
+        self.calls += 1
+        raise OSError("unreachable")
+
+class TestEntropyPool(unittest.TestCase):
+    def test_draws_come_from_buffer(self):
+        with EntropyPool([DeterministicSource(b'test', quantum=True)], capacity=512, batch_size=128) as pool:
+            first, quantum = pool.take(32, timeout=5)
+            self.assertTrue(quantum)
+            # Consecutive draws continue the source stream without overlap
+            second, _ = pool.take(32, timeout=5)
+            self.assertEqual(first + second, DeterministicSource(b'test').read(64))
+            for _ in range(200):
+                pool.take(16, timeout=5)
+            stats = pool.stats()
+            self.assertEqual(stats['draws'], 202)
+            self.assertEqual(stats['sources']['deterministic']['served'], 64 + 200 * 16)
+            self.assertLessEqual(stats['buffered'], stats['capacity'])
+            with self.assertRaises(ValueError):
+                pool.take(513)
+
+    def test_failing_source_falls_through_and_backs_off(self):
+        failing = _FailingSource()
+        with EntropyPool([failing, DeterministicSource(name='local')], capacity=256,
+                         batch_size=64, retry_interval=60) as pool:
+            data, quantum = pool.take(64, timeout=5)
+            self.assertEqual(len(data), 64)
+            self.assertFalse(quantum)
+            time.sleep(0.05)
+            stats = pool.stats()['sources']
+        self.assertEqual((failing.calls, stats['failing']['failures']), (1, 1))
+        self.assertEqual(stats['local']['bytes'], 256)
+
+    def test_refills_for_draws_above_low_water(self):
+        with EntropyPool([DeterministicSource()], capacity=100, batch_size=100) as pool:
+            pool.take(40, timeout=5)
+            # 60 bytes stay buffered, above low_water, yet short of this draw
+            self.assertEqual(len(pool.take(70, timeout=5)[0]), 70)
+        for low_water in (0, 101):
+            with self.assertRaises(ValueError):
+                EntropyPool([DeterministicSource()], capacity=100, low_water=low_water)
+    
+    def test_timeout_and_close(self):
+        pool = EntropyPool([_FailingSource()], capacity=64, retry_interval=60)
+        with self.assertRaises(TimeoutError):
+            pool.take(16, timeout=0.05)
+        pool.close()
+        with self.assertRaises(RuntimeError):
+            pool.take(16)
+
+    def test_cosmic_seed_from_pool(self):
+        with EntropyPool([DeterministicSource(quantum=True)], capacity=256) as pool:
+            seed, quantum_used = generate_cosmic_seed(pool=pool, timeout=5)
+            self.assertIsInstance(seed, int)
+            self.assertTrue(quantum_used)
+            # The pooled bytes feed the seed
+            self.assertNotEqual(generate_cosmic_seed(pool=pool, timeout=5)[0], seed)
+            self.assertEqual(seed, int(hashlib.sha3_256(
+                DeterministicSource(quantum=True).read(16)
+                + cosmic_cipher.DarkEntropyCollector().collect_dark_entropy(128).tobytes()).hexdigest(), 16) % 2**128)
+            with self.assertRaises(ValueError):
+                generate_cosmic_seed(bytes=pool.capacity + 1, pool=pool)
+        with EntropyPool([_FailingSource()], capacity=64) as pool:
+            self.assertFalse(generate_cosmic_seed(pool=pool, timeout=0.05)[1])
+            with self.assertRaises(TimeoutError):
+                generate_cosmic_seed(pool=pool, timeout=0.05, fallback=False)
+
+class TestBatchCipher(unittest.TestCase):
+    def setUp(self):
+        self.key, _ = generate_cosmic_seed()
+    
+    def test_matches_single_message_api(self):
+        messages = ["short", "特殊文字テスト" * 50, "🌌✨🚀"]
+        ivs = [generate_iv(self.key) for _ in messages]
+        results = encrypt_many(messages, self.key, ivs, workers=2)
+        for message, iv, result in zip(messages, ivs, results):
+            self.assertIsNone(result.error)
+            self.assertEqual(result.value, encrypt_authenticated(message, self.key, iv))
+            self.assertEqual(decrypt_authenticated(result.value, self.key), message)
+    
+    def test_round_trip_in_order(self):
+        messages = [f"record {i} " * (i % 7 + 1) for i in range(200)]
+        encrypted = [r.value for r in encrypt_many(messages, self.key)]
+        decrypted = decrypt_many(encrypted, self.key, workers=4)
+        self.assertEqual([r.value for r in decrypted], messages)
+    
+    def test_per_item_failures(self):
+        results = encrypt_many(["ok", "", None, "also ok"], self.key)
+        self.assertEqual([r.error is None for r in results], [True, False, False, True])
+        self.assertIsInstance(results[1].error, ValueError)
+        
+        encrypted = [results[0].value, dict(results[3].value, mac='0' * 64), {'iv': '1'}]
+        decrypted = decrypt_many(encrypted, self.key)
+        self.assertEqual(decrypted[0].value, "ok")
+        self.assertIsInstance(decrypted[1].error, ValueError)
+        self.assertIsInstance(decrypted[2].error, KeyError)
+    
+    def test_mixed_lengths_bound_batch_work(self):
+        messages = ["x"] * 200 + ["y" * 300, "z" * 200_000]
+        calls = []
+        
+        def recording(x0, y0, lengths, *args):
+            calls.append((len(lengths), max(lengths)))
+            return henon_batch(x0, y0, lengths, *args)
+        
+        with mock.patch('cosmic_cipher.henon_batch', side_effect=recording):
+            results = encrypt_many(messages, self.key)
+            decrypted = decrypt_many([r.value for r in results], self.key)
+        self.assertEqual([r.value for r in decrypted], messages)
+        # The long message is generated alone and short ones are not padded to it
+        self.assertTrue(all(rows * width <= cosmic_cipher._BATCH_MAX_ELEMENTS for rows, width in calls))
+        keystream_calls = [call for call in calls if call[1] != 128]
+        self.assertLessEqual(sum(rows * width for rows, width in keystream_calls), 2 * 2 * (200 + 300))
 
 if __name__ == '__main__':
     unittest.main()